@@ -0,0 +1,333 @@
+#
+# Benchmark suite of generated IPPcode23 workloads
+#
+# usage: bench.py [--interpreter=FILE] [--args=ARGS] [--scale=N] [--repeat=N] [--only=NAME]...
+#                 [--baseline=FILE] [--save] [--threshold=RATIO]
+#
+# Every workload is run in a fresh interpreter process, the report lists executed instructions per second,
+# peak memory (maximum resident set size of the process) and the startup time of an empty program,
+# both of the interpreter script (compiled on every run) and of the module run with -m (cached bytecode)
+# next to the startup time of a bare Python process.
+# With --save the results become the new baseline, otherwise they are compared with the baseline
+# and the return code is 1 if some value is worse than the baseline by more than the threshold.
+#
+import argparse
+import json
+import os
+import platform
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from xml.sax.saxutils import escape
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+INTERPRETER = os.path.join(os.path.dirname(BENCH_DIR), 'interpret.py')
+BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+
+def to_xml(listing: str) -> str:
+    # Build the XML representation of a program from its textual listing, one instruction per line
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<program language="IPPcode23">']
+    order = 0
+    for line in listing.splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+        order += 1
+        lines.append(f'  <instruction order="{order}" opcode="{parts[0]}">')
+        for num, token in enumerate(parts[1:], 1):
+            arg_type, text = arg_of(token)
+            lines.append(f'    <arg{num} type="{arg_type}">{escape(text)}</arg{num}>')
+        lines.append('  </instruction>')
+    lines.append('</program>')
+    return '\n'.join(lines) + '\n'
+
+
+def arg_of(token: str) -> tuple:
+    # Return the type and text of an instruction argument written as in the IPPcode23 source
+    if token.startswith(('GF@', 'LF@', 'TF@')):
+        return 'var', token
+    for arg_type in ('int', 'bool', 'string', 'nil', 'float'):
+        if token.startswith(arg_type + '@'):
+            return arg_type, token[len(arg_type) + 1:]
+    if token in {'int', 'bool', 'string', 'float'}:
+        return 'type', token
+    return 'label', token
+
+
+def loop(scale: int) -> tuple:
+    # Counted loops with JUMPIFEQ/JUMPIFNEQ and integer arithmetic
+    count = 100000 * scale
+    listing = f"""
+        DEFVAR GF@i
+        DEFVAR GF@sum
+        DEFVAR GF@cond
+        MOVE GF@i int@0
+        MOVE GF@sum int@0
+        LABEL loop
+        ADD GF@sum GF@sum GF@i
+        SUB GF@sum GF@sum int@1
+        MUL GF@cond GF@i int@2
+        ADD GF@i GF@i int@1
+        LT GF@cond GF@i int@{count}
+        JUMPIFEQ loop GF@cond bool@true
+        LABEL inner
+        SUB GF@i GF@i int@1
+        JUMPIFNEQ inner GF@i int@0
+        WRITE GF@sum
+    """
+    return listing, ''
+
+
+def recursion(scale: int) -> tuple:
+    # Recursive Fibonacci numbers with CALL/RETURN and a local frame per call
+    number = 18 + scale
+    listing = f"""
+        DEFVAR GF@result
+        CREATEFRAME
+        DEFVAR TF@n
+        MOVE TF@n int@{number}
+        CALL fib
+        MOVE GF@result TF@result
+        WRITE GF@result
+        EXIT int@0
+        LABEL fib
+        PUSHFRAME
+        DEFVAR LF@result
+        DEFVAR LF@cond
+        LT LF@cond LF@n int@2
+        JUMPIFEQ base LF@cond bool@true
+        CREATEFRAME
+        DEFVAR TF@n
+        SUB TF@n LF@n int@1
+        CALL fib
+        MOVE LF@result TF@result
+        CREATEFRAME
+        DEFVAR TF@n
+        SUB TF@n LF@n int@2
+        CALL fib
+        ADD LF@result LF@result TF@result
+        POPFRAME
+        RETURN
+        LABEL base
+        MOVE LF@result LF@n
+        POPFRAME
+        RETURN
+    """
+    return listing, ''
+
+
+def stack(scale: int) -> tuple:
+    # Stack-mode arithmetic with PUSHS/POPS, ADDS/SUBS and JUMPIFEQS
+    count = 50000 * scale
+    listing = f"""
+        DEFVAR GF@i
+        DEFVAR GF@sum
+        MOVE GF@i int@{count}
+        MOVE GF@sum int@0
+        LABEL loop
+        PUSHS GF@sum
+        PUSHS GF@i
+        ADDS
+        PUSHS int@3
+        SUBS
+        POPS GF@sum
+        PUSHS GF@i
+        PUSHS int@1
+        SUBS
+        POPS GF@i
+        PUSHS GF@i
+        PUSHS int@0
+        JUMPIFNEQS loop
+        WRITE GF@sum
+    """
+    return listing, ''
+
+
+def strings(scale: int) -> tuple:
+    # String building with CONCAT, SETCHAR, GETCHAR and STRLEN
+    count = 50000 * scale
+    listing = f"""
+        DEFVAR GF@s
+        DEFVAR GF@c
+        DEFVAR GF@i
+        DEFVAR GF@len
+        DEFVAR GF@cond
+        MOVE GF@s string@
+        MOVE GF@i int@0
+        LABEL build
+        CONCAT GF@s GF@s string@ab
+        GETCHAR GF@c GF@s GF@i
+        SETCHAR GF@s GF@i string@x
+        STRLEN GF@len GF@s
+        ADD GF@i GF@i int@1
+        LT GF@cond GF@i int@{count}
+        JUMPIFEQ build GF@cond bool@true
+        WRITE GF@len
+        WRITE GF@c
+    """
+    return listing, ''
+
+
+def io(scale: int) -> tuple:
+    # READ and WRITE heavy program echoing its numeric input
+    count = 50000 * scale
+    listing = """
+        DEFVAR GF@value
+        DEFVAR GF@type
+        LABEL loop
+        READ GF@value int
+        TYPE GF@type GF@value
+        JUMPIFEQ end GF@type string@nil
+        WRITE GF@value
+        WRITE string@\\010
+        JUMP loop
+        LABEL end
+    """
+    return listing, ''.join(f'{num}\n' for num in range(count))
+
+
+WORKLOADS = {'loop': loop, 'recursion': recursion, 'stack': stack, 'strings': strings, 'io': io}
+
+
+def measure(command: list, input_file: str = None, env: dict = None) -> tuple:
+    # Run the command once, return its wall time, peak memory in kilobytes and return code
+    stdin = open(input_file, 'r') if input_file is not None else subprocess.DEVNULL
+    try:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, stdin=stdin, stdout=subprocess.DEVNULL, env=env)
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+    finally:
+        if input_file is not None:
+            stdin.close()
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return elapsed, usage.ru_maxrss, process.returncode
+
+
+def count_insts(command: list, directory: str, input_file: str = None) -> int:
+    # Return the number of instructions executed by the program, counted by the --insts statistics
+    stats_file = os.path.join(directory, 'insts')
+    _, _, code = measure(command + [f'--stats={stats_file}', '--insts'], input_file)
+    if code != 0:
+        sys.exit(f'benchmark program failed with return code {code}')
+    with open(stats_file) as file:
+        return int(file.read().split()[0])
+
+
+def startup(command: list, repeat: int, env: dict = None) -> float:
+    # Return the best wall time of the command, the first run warms up caches and is not counted
+    measure(command, env=env)
+    return round(min(measure(command, env=env)[0] for _ in range(repeat)), 6)
+
+
+def run_benchmarks(args: argparse.Namespace) -> dict:
+    # Generate and run all selected workloads, return their results and the startup time
+    command = [sys.executable, args.interpreter] + shlex.split(args.args)
+    results = {'python': platform.python_version(), 'args': args.args, 'scale': args.scale, 'workloads': {}}
+    with tempfile.TemporaryDirectory() as directory:
+        empty = os.path.join(directory, 'empty.src')
+        with open(empty, 'w') as file:
+            file.write(to_xml(''))
+        results['startup'] = startup(command + [f'--source={empty}'], args.repeat * 3)
+        # the module is imported from the interpreter directory with bytecode caching allowed
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(args.interpreter)))
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+        module = os.path.splitext(os.path.basename(args.interpreter))[0]
+        results['module_startup'] = startup([sys.executable, '-m', module] + shlex.split(args.args)
+                                            + [f'--source={empty}'], args.repeat * 3, env)
+        results['python_startup'] = startup([sys.executable, '-c', 'pass'], args.repeat * 3)
+
+        for name, workload in WORKLOADS.items():
+            if args.only and name not in args.only:
+                continue
+            listing, input_text = workload(args.scale)
+            source = os.path.join(directory, f'{name}.src')
+            with open(source, 'w') as file:
+                file.write(to_xml(listing))
+            input_file = None
+            if input_text:
+                input_file = os.path.join(directory, f'{name}.in')
+                with open(input_file, 'w') as file:
+                    file.write(input_text)
+
+            run_command = command + [f'--source={source}']
+            insts = count_insts(run_command, directory, input_file)
+            times, peak = [], 0
+            for _ in range(args.repeat):
+                elapsed, memory, _ = measure(run_command, input_file)
+                times.append(elapsed)
+                peak = max(peak, memory)
+            best = min(times)
+            results['workloads'][name] = {'insts': insts, 'time': round(best, 6),
+                                          'ips': round(insts / best), 'peak_kb': peak}
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    # Return descriptions of values worse than in the baseline by more than the threshold ratio
+    regressions = []
+    for name in ('startup', 'module_startup'):
+        if name in baseline and results[name] > baseline[name] * (1 + threshold):
+            regressions.append(f"{name} {baseline[name]:.4f}s -> {results[name]:.4f}s")
+    for name, result in results['workloads'].items():
+        base = baseline['workloads'].get(name)
+        if base is None:
+            continue
+        if result['ips'] < base['ips'] * (1 - threshold):
+            regressions.append(f"{name} ips {base['ips']} -> {result['ips']}")
+        if result['peak_kb'] > base['peak_kb'] * (1 + threshold):
+            regressions.append(f"{name} peak memory {base['peak_kb']}kB -> {result['peak_kb']}kB")
+    return regressions
+
+
+def report(results: dict, baseline: dict = None) -> None:
+    # Print a table of the results and their ratios to the baseline values
+    print(f"{'workload':<10} {'insts':>10} {'time [s]':>9} {'insts/s':>11} {'peak [kB]':>10}  vs baseline")
+    for name, result in results['workloads'].items():
+        base = (baseline or {}).get('workloads', {}).get(name)
+        ratio = f"{result['ips'] / base['ips']:.2f}x" if base else '-'
+        print(f"{name:<10} {result['insts']:>10} {result['time']:>9.3f} {result['ips']:>11} "
+              f"{result['peak_kb']:>10}  {ratio}")
+    for name, label in (('startup', 'startup'), ('module_startup', 'startup -m'), ('python_startup', 'python')):
+        ratio = f"{baseline[name] / results[name]:.2f}x" if baseline and name in baseline else '-'
+        print(f"{label:<10} {'':>10} {results[name]:>9.4f} {'':>11} {'':>10}  {ratio}")
+
+
+def main() -> None:
+    # Entry point of the benchmark runner
+    parser = argparse.ArgumentParser(description='Benchmark suite of generated IPPcode23 workloads')
+    parser.add_argument('--interpreter', default=INTERPRETER, help='interpreter script to benchmark')
+    parser.add_argument('--args', default='', help='additional interpreter arguments, e.g. "--engine=adaptive"')
+    parser.add_argument('--scale', type=int, default=1, help='size multiplier of the workloads')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs, the best one is reported')
+    parser.add_argument('--only', action='append', choices=list(WORKLOADS), help='run only the given workload')
+    parser.add_argument('--baseline', default=BASELINE, help='baseline JSON file')
+    parser.add_argument('--save', action='store_true', help='save the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed relative regression (0.1 = 10%%)')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args)
+    baseline = None
+    if not args.save and os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    report(results, baseline)
+
+    if args.save:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+            file.write('\n')
+        print(f'baseline saved to {args.baseline}')
+    elif baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION: {regression}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
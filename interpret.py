@@ -1,15 +1,140 @@
 #
 # Abayev Amirkhan (xabaye00)
 #
-import xml.etree.ElementTree as ET
-import re
+import array
+import io
+import marshal
+import operator
+import os
 import sys
+import time
+import zlib
+
+# Indexes of the frames in Function.frames
+GF, LF, TF = 0, 1, 2
+FRAMES = {'GF': GF, 'LF': LF, 'TF': TF}
+
+# Value of a frame slot whose variable has not been defined
+UNDEFINED = object()
+# Slot of every frame holding its number of defined variables, the variable slots follow it
+DEFINED = 0
+
+
+class InterpretError(Exception):
+    """
+    Interpretation error class, code is the return code of the interpreter
+    """
+    code = 99
+
+
+class ParameterError(InterpretError):
+    """
+    Missing or invalid command line parameter
+    """
+    code = 10
+
+
+class InputFileError(InterpretError):
+    """
+    Input file that cannot be opened or read
+    """
+    code = 11
+
+
+class OutputFileError(InterpretError):
+    """
+    Output file that cannot be opened or written
+    """
+    code = 12
+
+
+class XMLFormatError(InterpretError):
+    """
+    Source that is not well-formed XML
+    """
+    code = 31
+
+
+class XMLStructureError(InterpretError):
+    """
+    Unexpected XML structure or lexical and syntactic error of the source
+    """
+    code = 32
+
+
+class SemanticError(InterpretError):
+    """
+    Semantic error of the source, e.g. an undefined label or a redefined variable
+    """
+    code = 52
+
+
+class OperandTypeError(InterpretError):
+    """
+    Operands of a wrong type
+    """
+    code = 53
+
+
+class UndefinedVariableError(InterpretError):
+    """
+    Access to a non-existent variable
+    """
+    code = 54
+
+
+class FrameError(InterpretError):
+    """
+    Access to a non-existent frame
+    """
+    code = 55
+
+
+class MissingValueError(InterpretError):
+    """
+    Missing value in a variable, on the data stack or on the call stack
+    """
+    code = 56
+
+
+class OperandValueError(InterpretError):
+    """
+    Operand of a wrong value, e.g. division by zero or an invalid EXIT code
+    """
+    code = 57
+
+
+class StringError(InterpretError):
+    """
+    Wrong string operation
+    """
+    code = 58
+
+
+class ProgramExit(Exception):
+    """
+    Program termination by the EXIT instruction
+    """
+    def __init__(self, code: int) -> None:
+        # Initialize the exit with the return code given to EXIT
+        super().__init__(code)
+        self.code = code
+
+
+class JobTimeout(Exception):
+    """
+    Batch or server job which exceeded its time limit, it is not an OSError, so I/O error handlers do not catch it
+    """
 
 
 class Argument:
     """
     Instruction argument class
     """
+    __slots__ = ('type_', 'text')
+    # Argument types accepted in any case, constant types have to be lowercase
+    CASELESS = {'var', 'label', 'type', 'nil'}
+    CONSTANTS = {'int', 'bool', 'string', 'float'}
 
     def __init__(self, arg_type: str, text: str) -> None:
         # Initializes an instance of Argument with an argument type and text
@@ -22,6 +147,35 @@ class Argument:
         arg_type, text = cls._filter_arg(arg_type, text)
         return Argument(arg_type, text)
 
+    def decode(self) -> any:
+        # Converts the argument into the value used by the executor: variables become (frame, name)
+        # tuples, constants become Python values and labels and types stay plain strings,
+        # constants of a type which is not lowercase stay plain strings and are rejected by the operand checks
+        kind = self.kind()
+        if kind == 'var':
+            frame, _, name = self.text.partition('@')
+            return frame, name
+        elif kind in {'label', 'type', 'string'}:
+            return self.text
+        elif kind == 'bool':
+            return self.text.lower() == 'true'
+        elif kind == 'nil':
+            return None
+        elif kind in {'int', 'float'}:
+            try:
+                return int(self.text) if kind == 'int' else float(self.text)
+            except (TypeError, ValueError):
+                raise XMLStructureError()
+        elif kind.lower() in self.CONSTANTS:
+            return self.text
+        raise MissingValueError()
+
+    def kind(self) -> str:
+        # Type of the argument checked against the parameters of the instruction, lowercase for the types
+        # accepted in any case and exactly as written for the constant types
+        kind = self.type_.lower()
+        return kind if kind in self.CASELESS else self.type_
+
     @classmethod
     def _filter_arg(cls, arg_type: str, text: str) -> list:
         # Filters the argument type and text depending on its type
@@ -48,22 +202,34 @@ class Argument:
         try:
             int(text)
         except ValueError:
-            exit(32)  # Error
+            raise XMLStructureError()
 
     @staticmethod
     def _filter_string(text: str) -> str:
-        # Filters a string argument and replaces all unicode escape sequences with their corresponding characters
-        matches = set(re.findall(r'\\[0-9]{3}', text))
-        for match in matches:
-            text = text.replace(match, chr(int(match[1:])))
-        return text
+        # Filters a string argument and replaces all escape sequences \\ddd with their corresponding characters
+        if '\\' not in text:
+            return text
+        parts = []
+        start = 0
+        index = text.find('\\')
+        while index != -1:
+            code = text[index + 1:index + 4]
+            if len(code) == 3 and code.isascii() and code.isdigit():
+                parts.append(text[start:index])
+                parts.append(chr(int(code)))
+                start = index + 4
+                index = text.find('\\', start)
+            else:
+                index = text.find('\\', index + 1)
+        parts.append(text[start:])
+        return ''.join(parts)
 
     @staticmethod
     def _filter_type(text: str) -> str:
         # Filters a type argument and exits with error code 56 if not valid
         text = text.lower()
         if text not in {'int', 'string', 'bool', 'float'}:
-            exit(56)  # Error
+            raise MissingValueError()
         return text
 
     @staticmethod
@@ -76,8 +242,8 @@ class Argument:
             pass
         try:
             float.hex(float(float_value))
-        except ValueError:
-            exit(32)  # Error
+        except (TypeError, ValueError):
+            raise XMLStructureError()
         return float_value
 
 
@@ -85,149 +251,736 @@ class Instruction:
     """
     Instruction class
     """
-    all_ = []
+    __slots__ = ('order', 'opcode', 'args')
 
-    def __init__(self, order: int, opcode: str, args: list) -> None:
+    def __init__(self, order: int, opcode: str, args: tuple) -> None:
         # Initialize an instance of Instruction with an order, opcode and list of arguments
         self.order = order
         self.opcode = opcode
         self.args = args
 
-        Instruction.all_.append(self)
-
     @classmethod
-    def get_instructions_from_xml(cls, src: str) -> list:
-        # Parse an XML file and return structured instructions
-        root = cls._parse_xml(src)
-        cls._validate_root(root)
-
-        for instr in root:
-            cls._parse_instruction(instr)
+    def get_instructions_from_xml(cls, src: any) -> list:
+        # Parse an XML file (a file name or a stream) element by element and return structured instructions,
+        # every instruction element is dropped from the tree as soon as it is parsed,
+        # equal arguments are parsed once and shared by all instructions through the pool;
+        # the first structural error is raised only after the whole document is known to be well-formed
+        import xml.etree.ElementTree as ET
+        instructions = []
+        pool = {}
+        root = None
+        depth = 0
+        error = None
+        try:
+            for event, elem in ET.iterparse(src, events=('start', 'end')):
+                if event == 'start':
+                    if root is None:
+                        root = elem
+                        try:
+                            cls._validate_root(root)
+                        except InterpretError as invalid:
+                            error = invalid
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth == 1:
+                    if error is None:
+                        try:
+                            instructions.append(cls._parse_instruction(elem, pool))
+                        except InterpretError as invalid:
+                            error = invalid
+                    root.clear()
+        except FileNotFoundError:
+            raise InputFileError()
+        except ET.ParseError:
+            raise XMLFormatError()
 
-        return cls.all_
+        if error is not None:
+            raise error
+        return instructions
 
     # Secondary functions
     @classmethod
-    def _parse_instruction(cls, instr: ET.Element) -> None:
-        # Parse an instruction and append it to the 'all_' list
+    def _parse_instruction(cls, instr: 'ET.Element', pool: dict) -> any:
+        # Parse an instruction element into an Instruction, the opcode is interned and equal argument
+        # tuples are shared through the pool
         args = []
+        tags = {arg.tag: arg for arg in instr}
         for num in range(len(instr)):
-            arg = instr.find(f'arg{num + 1}')
-            arg_num, arg_value = cls._validate_argument(arg, num)
+            arg = tags.get(f'arg{num + 1}')
+            arg_num, arg_value = cls._validate_argument(arg, num, pool)
             args.append(arg_value)
         order, opcode = cls._validate_instruction(instr)
-        Instruction(order=order, opcode=opcode, args=args)
-
-    @staticmethod
-    def _parse_xml(src: str) -> ET.Element:
-        # Parse an XML file and return its root
-        try:
-            root = ET.parse(src).getroot()
-        except FileNotFoundError:
-            exit(11)  # Error
-        except ET.ParseError:
-            exit(31)  # Error
-        return root
+        args = tuple(args)
+        return Instruction(order=order, opcode=sys.intern(opcode), args=pool.setdefault(args, args))
 
     @staticmethod
-    def _validate_root(root: ET.Element) -> None:
+    def _validate_root(root: 'ET.Element') -> None:
         # Check if the root tag and language attribute are valid
-        if root.tag != 'program' or root.attrib['language'] != 'IPPcode23':
-            exit(32)  # Error
+        if root.tag != 'program' or root.get('language') != 'IPPcode23':
+            raise XMLStructureError()
 
     @staticmethod
-    def _validate_instruction(instr: ET.Element) -> tuple:
+    def _validate_instruction(instr: 'ET.Element') -> tuple:
         # Check if the instruction tag, 'order' and 'opcode' attributes are valid
         if instr.tag != 'instruction' or 'order' not in instr.attrib or 'opcode' not in instr.attrib:
-            exit(32)  # Error
+            raise XMLStructureError()
         try:
             order = int(instr.get('order'))
         except ValueError:
-            exit(32)  # Error
+            raise XMLStructureError()
         return order, instr.get('opcode')
 
     @staticmethod
-    def _validate_argument(arg: ET.Element, num: int) -> tuple:
-        # Check if the argument is valid and return its index and an instance of Argument class
+    def _validate_argument(arg: 'ET.Element', num: int, pool: dict) -> tuple:
+        # Check if the argument is valid and return its index and an instance of Argument class,
+        # the instance is taken from the pool of arguments with the same type and text if possible
         if arg is None or 'type' not in arg.attrib:
-            exit(32)  # Error
+            raise XMLStructureError()
         text = arg.text.strip() if arg.text is not None else ''
-        return num, Argument.add(arg.get('type'), text)
+        key = (arg.get('type'), text)
+        if key not in pool:
+            pool[key] = Argument.add(sys.intern(key[0]), text)
+        return num, pool[key]
+
+
+class Program:
+    """
+    Compiled program class
+    """
+    FIELDS = ('orders', 'opcodes', 'kinds', 'operands', 'positions', 'labels', 'variables', 'opcode_counts')
+
+    def __init__(self, instructions: list) -> None:
+        # Decodes the sorted instructions once, so the executor never formats or parses operand strings,
+        # instructions with the same arguments share their kinds and operands tuples
+        self.orders = []
+        self.opcodes = []
+        self.kinds = []
+        self.operands = []
+        # Position of every instruction in the sorted list of all instructions (including labels)
+        self.positions = array.array('q', range(len(instructions)))
+        self.labels = {}
+        # Names of the variables following the DEFINED slot, of GF and of every group of LF/TF frames
+        self.variables = ([], [])
+        # How many times every opcode occurs in the source program
+        self.opcode_counts = {}
+
+        # Arguments are compared by identity, the parser shares equal ones
+        decoded = {}
+        kinds_pool = {}
+        for instruction in instructions:
+            args = tuple(instruction.args)
+            if args not in decoded:
+                kinds = tuple(sys.intern(arg.kind()) for arg in args)
+                decoded[args] = (kinds_pool.setdefault(kinds, kinds), tuple(arg.decode() for arg in args))
+            kinds, operands = decoded[args]
+            self.orders.append(instruction.order)
+            self.opcodes.append(instruction.opcode)
+            self.kinds.append(kinds)
+            self.operands.append(operands)
+            self.opcode_counts[instruction.opcode] = self.opcode_counts.get(instruction.opcode, 0) + 1
+
+    def __len__(self) -> int:
+        # Number of instructions in the program
+        return len(self.opcodes)
+
+    def assign_slots(self) -> None:
+        # Replace the (frame, name) operands of a checked program with resolved labels by (frame index, slot index)
+        # pairs, the slots of every frame start after DEFINED; LF and TF are numbered per group of CREATEFRAME
+        # positions whose frames may be accessed by the same instruction, so frames only get the slots of their group
+        groups = self._frame_groups()
+        slots = {}
+        # Shared operands are renamed once per group, keyed by their identity (the original tuple is kept alive)
+        renamed = {}
+        variables = {}
+        for position, kinds in enumerate(self.kinds):
+            if 'var' not in kinds:
+                continue
+            original = self.operands[position]
+            key = (id(original), groups.get(position, (None, None)))
+            if key not in renamed:
+                operands = list(original)
+                for num, kind in enumerate(kinds):
+                    if kind == 'var':
+                        frame, name = operands[num]
+                        group = 'GF' if frame == 'GF' else key[1][FRAMES[frame] - LF]
+                        if (group, name) not in variables:
+                            names = slots.setdefault(group, {})
+                            variables[group, name] = names.setdefault(name, DEFINED + 1 + len(names))
+                        operands[num] = (FRAMES[frame], variables[group, name])
+                renamed[key] = (original, tuple(operands))
+            self.operands[position] = renamed[key][1]
+        self.variables = (list(slots.pop('GF', ())), [list(names) for names in slots.values()])
+
+    def resolve_labels(self) -> None:
+        # Replace label operands by the position a taken branch continues from and drop LABEL instructions,
+        # the target is the position just before the first instruction following the label,
+        # because the executor increments the position after every instruction
+        targets = {}
+        kept = []
+        for position, opcode in enumerate(self.opcodes):
+            if opcode.upper() == 'LABEL':
+                targets[position] = len(kept) - 1
+            else:
+                kept.append(position)
+        self.labels = {label: targets[position] for label, position in self.labels.items()}
+
+        resolved = {}
+        for position in kept:
+            kinds = self.kinds[position]
+            if 'label' in kinds:
+                original = self.operands[position]
+                if id(original) not in resolved:
+                    operands = list(original)
+                    for num, kind in enumerate(kinds):
+                        if kind == 'label':
+                            if operands[num] not in self.labels:
+                                raise SemanticError()
+                            operands[num] = self.labels[operands[num]]
+                    resolved[id(original)] = (original, tuple(operands))
+                self.operands[position] = resolved[id(original)][1]
+
+        for field in ('orders', 'opcodes', 'kinds', 'operands', 'positions'):
+            values = getattr(self, field)
+            setattr(self, field, [values[position] for position in kept])
+        self.orders = self._compact(self.orders)
+        self.positions = self._compact(self.positions)
+
+    def successors(self, position: int) -> list:
+        # Positions that may be executed after the instruction at the given position,
+        # CALL continues at its target and the return back to the next instruction is not included
+        opcode = self.opcodes[position].upper()
+        if opcode in {'RETURN', 'EXIT'}:
+            return []
+        elif opcode in {'JUMP', 'CALL'}:
+            return [self.operands[position][0] + 1]
+        elif opcode.startswith('JUMPIF'):
+            return [self.operands[position][0] + 1, position + 1]
+        return [position + 1]
+
+    def _frame_groups(self) -> dict:
+        # Groups of the local and the temporary frame of the instructions accessing LF or TF variables, a group is
+        # identified by its first CREATEFRAME position, instructions missing here (and frames that do not exist)
+        # use the None group, which is the only one if the frames are not tracked
+        accesses = []
+        for position, kinds in enumerate(self.kinds):
+            if 'var' in kinds and any(kind == 'var' and operand[0] != 'GF'
+                                      for kind, operand in zip(kinds, self.operands[position])):
+                accesses.append(position)
+        sites = self._frame_sites() if accesses else None
+        if sites is None:
+            return {}
+        # Sites whose frames may be accessed by the same instruction are merged into one group
+        merged = {}
+        for position in accesses:
+            if sites[position] is None:
+                continue
+            for kind, operand in zip(self.kinds[position], self.operands[position]):
+                if kind == 'var' and operand[0] != 'GF':
+                    group = set(sites[position][FRAMES[operand[0]] - LF])
+                    for site in tuple(group):
+                        group |= merged.get(site, frozenset())
+                    group = frozenset(group)
+                    for site in group:
+                        merged[site] = group
+        return {position: tuple(min(merged.get(min(frame), frame)) if frame else None for frame in sites[position])
+                for position in accesses if sites[position] is not None}
+
+    def _frame_sites(self) -> any:
+        # CREATEFRAME positions the local and the temporary frame of every instruction may come from (None if the
+        # instruction is unreachable), found by propagating the frames of the frame stack along all paths;
+        # returns None if the frame stack depth of some position depends on the path
+        count = len(self.opcodes)
+        # Positions of the CALLs of every target and the targets whose body (the positions reachable from the
+        # target without entering other calls) contains every RETURN
+        calls = {}
+        owners = {}
+        for position, opcode in enumerate(self.opcodes):
+            if opcode.upper() == 'CALL':
+                calls.setdefault(self.operands[position][0], []).append(position)
+        for target in calls:
+            body = set()
+            pending = [target + 1]
+            while pending:
+                position = pending.pop()
+                if position >= count or position in body:
+                    continue
+                body.add(position)
+                opcode = self.opcodes[position].upper()
+                if opcode == 'RETURN':
+                    owners.setdefault(position, []).append(target)
+                pending.extend([position + 1] if opcode == 'CALL' else self.successors(position))
+
+        # States are (temporary, local, stack) of the sites of TF, LF and the frames below LF on the frame stack,
+        # the frame stack of a function is relative to its local frame when called
+        states = [None] * count
+        pending = []
+        if count:
+            states[0] = (frozenset(), frozenset(), ())
+            pending.append(0)
+        while pending:
+            position = pending.pop()
+            temporary, local, stack = states[position]
+            opcode = self.opcodes[position].upper()
+            if opcode == 'CREATEFRAME':
+                temporary = frozenset((position,))
+            elif opcode == 'PUSHFRAME':
+                temporary, local, stack = frozenset(), temporary, stack + (local,)
+            elif opcode == 'POPFRAME':
+                if not stack:
+                    return None
+                temporary, local, stack = local, stack[-1], stack[:-1]
+
+            if opcode == 'CALL':
+                target = self.operands[position][0]
+                flows = [(target + 1, (temporary, local, ()))]
+                flows += [(position + 1, (states[end][0], local, stack)) for end in owners
+                          if target in owners[end] and states[end] is not None]
+            elif opcode == 'RETURN':
+                if stack:
+                    return None
+                flows = [(call + 1, (temporary,) + states[call][1:]) for target in owners.get(position, ())
+                         for call in calls[target] if states[call] is not None]
+            else:
+                flows = [(successor, (temporary, local, stack)) for successor in self.successors(position)]
+
+            for successor, state in flows:
+                if successor >= count:
+                    continue
+                previous = states[successor]
+                if previous is not None:
+                    if len(previous[2]) != len(state[2]):
+                        return None
+                    state = (previous[0] | state[0], previous[1] | state[1],
+                             tuple(old | new for old, new in zip(previous[2], state[2])))
+                    if state == previous:
+                        continue
+                states[successor] = state
+                pending.append(successor)
+        return [state and (state[1], state[0]) for state in states]
+
+    def dump(self) -> bytes:
+        # Serialize the program into a compact binary form
+        values = (getattr(self, field) for field in self.FIELDS)
+        return marshal.dumps(tuple(list(value) if isinstance(value, array.array) else value for value in values))
+
+    @classmethod
+    def load(cls, data: bytes) -> any:
+        # Deserialize a program created by dump, raises ValueError if the data are malformed
+        try:
+            values = marshal.loads(data)
+        except (EOFError, TypeError):
+            raise ValueError('malformed program')
+        if not isinstance(values, tuple) or len(values) != len(cls.FIELDS):
+            raise ValueError('malformed program')
+        program = cls([])
+        for field, value in zip(cls.FIELDS, values):
+            setattr(program, field, value)
+        try:
+            program.orders = cls._compact(program.orders)
+            program.positions = cls._compact(program.positions)
+        except TypeError:
+            raise ValueError('malformed program')
+        if not len(program.orders) == len(program.opcodes) == len(program.kinds) == len(program.operands) \
+                == len(program.positions):
+            raise ValueError('malformed program')
+        return program
+
+    # Secondary functions
+    @staticmethod
+    def _compact(values: any) -> any:
+        # Store integers in an array of machine words, a list is kept if some value does not fit
+        try:
+            return array.array('q', values)
+        except OverflowError:
+            return list(values)
+
+
+class ProgramCache:
+    """
+    Compiled program cache class
+    """
+    MAGIC = b'IPPC'
+    VERSION = 5
+
+    def __init__(self, directory: str) -> None:
+        # Initialize the cache stored in the given directory
+        self.directory = directory
+
+    def key(self, src: any) -> str:
+        # Hash the source bytes together with the cache format version, the source is a file name
+        # or a seekable binary stream, which is rewound to where it started
+        import hashlib
+        digest = hashlib.sha256(bytes([self.VERSION]))
+        if not isinstance(src, (str, os.PathLike)):
+            start = src.tell()
+            for chunk in iter(lambda: src.read(1 << 16), b''):
+                digest.update(chunk)
+            src.seek(start)
+            return digest.hexdigest()
+        try:
+            with open(src, 'rb') as file:
+                for chunk in iter(lambda: file.read(1 << 16), b''):
+                    digest.update(chunk)
+        except FileNotFoundError:
+            raise InputFileError()
+        return digest.hexdigest()
+
+    def get(self, key: str) -> any:
+        # Return the cached program, or None if the entry is missing, stale or corrupt
+        try:
+            with open(self._path(key), 'rb') as file:
+                data = file.read()
+        except OSError:
+            return None
+        header = self.MAGIC + bytes([self.VERSION]) + bytes.fromhex(key)
+        payload = data[len(header) + 4:]
+        checksum = data[len(header):len(header) + 4]
+        if not data.startswith(header) or checksum != zlib.crc32(payload).to_bytes(4, 'big'):
+            return None
+        try:
+            return Program.load(payload)
+        except ValueError:
+            return None
+
+    def put(self, key: str, program: Program) -> None:
+        # Store the program, the cache is optional, so failures are silently ignored
+        payload = program.dump()
+        data = self.MAGIC + bytes([self.VERSION]) + bytes.fromhex(key) + zlib.crc32(payload).to_bytes(4, 'big')
+        tmp = f'{self._path(key)}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, 'wb') as file:
+                file.write(data + payload)
+            os.replace(tmp, self._path(key))
+        except OSError:
+            pass
+
+    def _path(self, key: str) -> str:
+        # Path of the cache entry for the given key
+        return os.path.join(self.directory, f'{key}.ippc')
+
+
+class TypeInference:
+    """
+    Static type inference class
+    """
+    # Abstract types are bit masks of the types a value can have
+    INT, FLOAT, STRING, BOOL, NIL = 1, 2, 4, 8, 16
+    ANY = 31
+    NUMBER = INT | FLOAT
+    TYPES = {int: INT, float: FLOAT, str: STRING, bool: BOOL, type(None): NIL}
+    READ_TYPES = {'int': INT, 'float': FLOAT, 'string': STRING, 'bool': BOOL}
+
+    def __init__(self, program: Program) -> None:
+        # Initialize the analysis of a compiled program
+        self.program = program
+
+    def run(self) -> set:
+        # Propagate variable types along the control flow until nothing changes and
+        # return positions of instructions whose dynamic type checks can never fail
+        program = self.program
+        size = len(program)
+        states = [None] * size
+        worklist = [0] if size else []
+        if size:
+            states[0] = {}
+        while worklist:
+            position = worklist.pop()
+            state = self._transfer(position, states[position])
+            successors = [(successor, state) for successor in program.successors(position)]
+            if program.opcodes[position].upper() == 'CALL':
+                # The callee may change any variable before it returns
+                successors.append((position + 1, {}))
+            for successor, out in successors:
+                if successor >= size:
+                    continue
+                if states[successor] is None:
+                    states[successor] = dict(out)
+                    worklist.append(successor)
+                    continue
+                joined = self._join(states[successor], out)
+                if joined != states[successor]:
+                    states[successor] = joined
+                    worklist.append(successor)
+
+        return {position for position in range(size)
+                if states[position] is not None and self._proven(position, states[position])}
+
+    # Secondary functions
+    def _types(self, operands: tuple, state: dict) -> list:
+        # Abstract types of the operands, variables which are not tracked can have any type
+        return [state.get(operand, self.ANY) if type(operand) is tuple else self.TYPES.get(type(operand), 0)
+                for operand in operands]
+
+    def _transfer(self, position: int, state: dict) -> dict:
+        # Return the state after the instruction at the position is executed without an error
+        opcode = self.program.opcodes[position].upper()
+        operands = self.program.operands[position]
+        state = dict(state)
+
+        if opcode == 'CREATEFRAME':
+            return {var: types for var, types in state.items() if var[0] != TF}
+        elif opcode == 'PUSHFRAME':
+            return {(var[0] if var[0] == GF else LF, var[1]): types for var, types in state.items() if var[0] != LF}
+        elif opcode == 'POPFRAME':
+            return {(var[0] if var[0] == GF else TF, var[1]): types for var, types in state.items() if var[0] != TF}
+        elif not operands or type(operands[0]) is not tuple or opcode == 'PUSHS':
+            return state
+
+        types = self._types(operands, state)
+        if opcode == 'DEFVAR':
+            result = self.NIL
+        elif opcode == 'MOVE':
+            result = types[1]
+        elif opcode in {'ADD', 'SUB', 'MUL', 'IDIV'}:
+            result = types[1] & types[2] & self.NUMBER
+        elif opcode in {'DIV', 'INT2FLOAT'}:
+            result = self.FLOAT
+        elif opcode in {'STRLEN', 'FLOAT2INT'}:
+            result = self.INT
+        elif opcode in {'LT', 'GT', 'EQ', 'AND', 'OR', 'NOT'}:
+            result = self.BOOL
+        elif opcode in {'CONCAT', 'GETCHAR', 'SETCHAR', 'INT2CHAR', 'STRI2INT'}:
+            result = self.STRING
+        elif opcode == 'TYPE':
+            # Floats leave the variable unchanged
+            result = self.STRING | types[0]
+        elif opcode == 'READ':
+            result = self.READ_TYPES[operands[1]] | self.NIL
+        else:
+            result = self.ANY
+        state[operands[0]] = result
+        return state
+
+    def _proven(self, position: int, state: dict) -> bool:
+        # Check if the type checks of the instruction are satisfied for every possible operand type
+        opcode = self.program.opcodes[position].upper()
+        types = self._types(self.program.operands[position], state)
+        if opcode in {'ADD', 'SUB', 'MUL', 'IDIV', 'DIV'}:
+            return types[1] == types[2] and types[1] in {self.INT, self.FLOAT}
+        elif opcode in {'LT', 'GT'}:
+            return types[1] == types[2] and types[1] in {self.INT, self.FLOAT, self.STRING, self.BOOL}
+        elif opcode in {'EQ', 'JUMPIFEQ', 'JUMPIFNEQ'}:
+            single = types[1] & (types[1] - 1) == 0
+            return (types[1] == types[2] and single) or self.NIL in {types[1], types[2]}
+        elif opcode in {'AND', 'OR'}:
+            return types[1] == types[2] == self.BOOL
+        elif opcode == 'NOT':
+            return types[1] == self.BOOL
+        elif opcode == 'CONCAT':
+            return types[1] == types[2] == self.STRING
+        elif opcode == 'STRLEN':
+            return types[1] == self.STRING
+        elif opcode == 'GETCHAR':
+            return types[1] == self.STRING and types[2] == self.INT
+        return False
+
+    @staticmethod
+    def _join(first: dict, second: dict) -> dict:
+        # Merge two states, a variable is only tracked if it is tracked in both
+        return {var: types | second[var] for var, types in first.items() if var in second}
+
+
+class Writer:
+    """
+    Buffered program output class
+    """
+    def __init__(self, stream: any = None, limit: int = 1 << 16) -> None:
+        # Initialize the writer, the buffer is written to the stream once it holds limit characters
+        self.stream = stream if stream is not None else sys.stdout
+        self.limit = limit
+        self.parts = []
+        self.size = 0
+
+    def write(self, value: any) -> None:
+        # Format the value the same way WRITE always did and add it to the buffer
+        if isinstance(value, bool):
+            text = 'true' if value else 'false'
+        elif value is None:
+            return
+        elif type(value) is float:
+            text = float.hex(value)
+        else:
+            text = str(value)
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.limit:
+            self.flush()
+
+    def flush(self) -> None:
+        # Write out everything buffered so far
+        if self.parts:
+            self.stream.write(''.join(self.parts))
+            self.parts = []
+            self.size = 0
+        self.stream.flush()
+
+
+class Reader:
+    """
+    Program input class
+    """
+    def __init__(self, stream: any = None) -> None:
+        # Initialize the reader, lines are read lazily from the buffered stream (standard input by default)
+        self.stream = stream if stream is not None else sys.stdin
+
+    def readline(self) -> any:
+        # Return the next line without its line terminator, or None at the end of input
+        line = self.stream.readline()
+        if not line:
+            return None
+        return line[:-1] if line[-1] == '\n' else line
+
+
+class StringBuffer:
+    """
+    String buffer class
+    """
+    def __init__(self, value: str) -> None:
+        # Initialize the buffer with the characters of a string, the joined string is cached until the next change
+        self.chars = list(value)
+        self.value = value
+
+    def __len__(self) -> int:
+        # Return the number of characters, used by STRLEN
+        return len(self.chars)
+
+    def __getitem__(self, index: int) -> str:
+        # Return one character, used by GETCHAR and STRI2INT
+        return self.chars[index]
+
+    def __str__(self) -> str:
+        # Join the characters into a plain string
+        if self.value is None:
+            self.value = ''.join(self.chars)
+        return self.value
+
+    def append(self, value: str) -> None:
+        # Append a string in place
+        self.chars.extend(value)
+        self.value = None
+
+    def setchar(self, index: int, char: str) -> None:
+        # Replace one character in place
+        self.chars[index] = char
+        self.value = None
 
 
 class Function:
     """
     Function class
     """
-    def __init__(self, stdin) -> None:
-        # Initialize the interpreter with the given input
-        self.stdin = stdin
-        self.frames = {
-            "GF": {},
-            "LF": None
-        }
+    # Operations used by _operator
+    OPERATORS = {
+        '+': operator.add,
+        '-': operator.sub,
+        '*': operator.mul,
+        '<': operator.lt,
+        '>': operator.gt,
+        'and': operator.and_,
+        'or': operator.or_,
+    }
+
+    def __init__(self, stdin, stdout=None, stderr=None) -> None:
+        # Initialize the interpreter with the given input and output streams (standard streams if None)
+        self.input = Reader(stdin)
+        self.output = Writer(stdout)
+        self.errors = stderr if stderr is not None else sys.stderr
+        # Frames are lists indexed by variable slots, they grow as variables get defined
+        self.frames = [[0], None, None]
         self.frame_stack = []
         self.stack = []
         self.position = 0
         self.call_stack = []
-        self.labels = {}
+        # Bound instructions being executed and their positions in the sorted source, reported by BREAK
+        self.code = []
+        self.positions = []
+
+        # Number of defined variables in all valid frames (including the frame stack) and its maximum
+        self.var_count = 0
+        self.max_vars = 0
 
-    def instr_move(self, var: str, symb: str) -> None:
+    @classmethod
+    def signatures(cls) -> dict:
+        # Maps every opcode to the name of its handler and the kinds of its parameters,
+        # the instr_* methods are introspected only once per class
+        if '_signatures' not in cls.__dict__:
+            cls._signatures = {}
+            for attr in dir(cls):
+                if attr.startswith('instr_'):
+                    code = getattr(cls, attr).__code__
+                    params = code.co_varnames[1:code.co_argcount]
+                    cls._signatures[attr[6:].upper()] = (attr, tuple(p.rstrip('_0123456789') for p in params))
+        return cls._signatures
+
+    def current_position(self, frame: any = None) -> int:
+        # Position of the instruction being executed, frame is the Python frame of the executing thread
+        return self.position
+
+    def instr_move(self, var: tuple, symb: any) -> None:
         # Move the value of a symb to a variable
         value = self._get_value(symb)
         self._set_value(var, value)
 
     def instr_createframe(self) -> None:
-        # Create a new temporary frame
-        self.frames["TF"] = {}
+        # Create a new temporary frame, variables of the discarded one are no longer counted
+        self._discard_tf()
+        self.frames[TF] = [0]
 
     def instr_pushframe(self) -> None:
         # Push the temporary frame onto the frame stack
-        if "TF" not in self.frames:
-            exit(55)  # Error
-        self.frame_stack.append(self.frames["LF"])
-        self.frames["LF"] = self.frames["TF"]
-        self.frames["TF"] = None
+        if self.frames[TF] is None:
+            raise FrameError()
+        self.frame_stack.append(self.frames[LF])
+        self.frames[LF] = self.frames[TF]
+        self.frames[TF] = None
 
     def instr_popframe(self) -> None:
         # Pop the top frame off the frame stack
         if not self.frame_stack:
-            exit(55)  # Error
-        self.frames["TF"] = self.frames["LF"]
-        self.frames["LF"] = self.frame_stack.pop()
+            raise FrameError()
+        self._discard_tf()
+        self.frames[TF] = self.frames[LF]
+        self.frames[LF] = self.frame_stack.pop()
 
-    def instr_defvar(self, var: str) -> None:
+    def instr_defvar(self, var: tuple) -> None:
         # Define a new variable in the given frame
-        frame, name = self._var_split(var)
-        if frame not in {'GF', 'LF', 'TF'}:
-            exit(52)  # Error
-        if frame == 'TF' and 'TF' not in self.frames:
-            exit(55)  # Error
-        if name in self.frames[frame]:
-            exit(52)  # Error
-        self.frames[frame][name] = None
-
-    def instr_call(self, label: str) -> None:
+        frame = self.frames[var[0]]
+        if frame is None:
+            raise FrameError()
+        slot = var[1]
+        if slot >= len(frame):
+            frame.extend([UNDEFINED] * (slot + 1 - len(frame)))
+        elif frame[slot] is not UNDEFINED:
+            raise SemanticError()
+        frame[slot] = None
+        frame[DEFINED] += 1
+        self.var_count += 1
+        if self.var_count > self.max_vars:
+            self.max_vars = self.var_count
+
+    def instr_call(self, label: int) -> None:
         # Call a function with the given label
         self.call_stack.append(self.position)
-        self.instr_jump(label)
+        self.position = label
 
     def instr_return(self) -> None:
         # Return from a function call
         if not self.call_stack:
-            exit(56)  # Error
+            raise MissingValueError()
         self.position = self.call_stack[-1]
         self.call_stack.pop()
 
-    def instr_pushs(self, symb: str) -> None:
+    def instr_pushs(self, symb: any) -> None:
         # Push a symb value onto the stack
         value = self._get_value(symb)
         self.stack.append(value)
 
-    def instr_pops(self, var: str) -> None:
+    def instr_pops(self, var: tuple) -> None:
         # Pop the top value off the stack and move it to a variable
         if not self.stack:
-            exit(56)  # Error
+            raise MissingValueError()
         value = self.stack[-1]
         self._set_value(var, value)
         self.stack.pop()
@@ -236,7 +989,7 @@ class Function:
         # Clear the stack
         self.stack = []
 
-    def instr_add(self, var: str, symb1: str, symb2: str) -> None:
+    def instr_add(self, var: tuple, symb1: any, symb2: any) -> None:
         # Add two symbs together and store the result in a variable
         value = self._operator(symb1, symb2, '+')
         self._set_value(var, value)
@@ -245,11 +998,11 @@ class Function:
         # Adds two values from the top of the stack and replaces them with their sum
         value1, value2 = self._get_values_from_stack(2)
         if type(value1) != type(value2) != int:
-            exit(53)  # Error
+            raise OperandTypeError()
         value = value1 + value2
         self._replace_stack_value(value, 2)
 
-    def instr_sub(self, var: str, symb1: str, symb2: str) -> None:
+    def instr_sub(self, var: tuple, symb1: any, symb2: any) -> None:
         # Subtracts two symbs and sets the result to a given variable
         value = self._operator(symb1, symb2, '-')
         self._set_value(var, value)
@@ -258,11 +1011,11 @@ class Function:
         # Subtracts two values from the top of the stack and replaces them with their difference
         value1, value2 = self._get_values_from_stack(2)
         if type(value1) != type(value2) != int:
-            exit(53)  # Error
+            raise OperandTypeError()
         value = value2 - value1
         self._replace_stack_value(value, 2)
 
-    def instr_mul(self, var: str, symb1: str, symb2: str) -> None:
+    def instr_mul(self, var: tuple, symb1: any, symb2: any) -> None:
         # Multiplies two symbs and sets the result to a given variable
         value = self._operator(symb1, symb2, '*')
         self._set_value(var, value)
@@ -271,16 +1024,16 @@ class Function:
         # Multiplies two values from the top of the stack and replaces them with their product
         value1, value2 = self._get_values_from_stack(2)
         if type(value1) != type(value2) != int:
-            exit(53)  # Error
+            raise OperandTypeError()
         value = value1 * value2
         self._replace_stack_value(value, 2)
 
-    def instr_div(self, var: str, symb1: str, symb2: str) -> None:
+    def instr_div(self, var: tuple, symb1: any, symb2: any) -> None:
         # Divides two symbs and sets the result to a given variable
         value = self._operator(symb1, symb2, '/')
         self._set_value(var, value)
 
-    def instr_idiv(self, var: str, symb1: str, symb2: str) -> None:
+    def instr_idiv(self, var: tuple, symb1: any, symb2: any) -> None:
         # Integer divides two symbs and sets the result to a given variable
         value = self._operator(symb1, symb2, '//')
         self._set_value(var, value)
@@ -289,11 +1042,11 @@ class Function:
         # Integer divides two values from the top of the stack and replaces them with their quotient
         value1, value2 = self._get_values_from_stack(2)
         if type(value1) != type(value2) != int:
-            exit(53)  # Error
+            raise OperandTypeError()
         value = value2 // value1
         self._replace_stack_value(value, 2)
 
-    def instr_lt(self, var: str, symb1: str, symb2: str) -> None:
+    def instr_lt(self, var: tuple, symb1: any, symb2: any) -> None:
         # Compares two symbs and sets the result to a given variable if the first value is less than the second
         value = self._operator(symb1, symb2, '<')
         self._set_value(var, value)
@@ -303,11 +1056,11 @@ class Function:
         # if the second value is less than the first
         value1, value2 = self._get_values_from_stack(2)
         if type(value1) != type(value2) or value1 is None:
-            exit(53)  # Error
+            raise OperandTypeError()
         value = value2 < value1
         self._replace_stack_value(value, 2)
 
-    def instr_gt(self, var: str, symb1: str, symb2: str) -> None:
+    def instr_gt(self, var: tuple, symb1: any, symb2: any) -> None:
         # Compares two symbs and sets the result to a given variable if the first value is greater than the second
         value = self._operator(symb1, symb2, '>')
         self._set_value(var, value)
@@ -317,11 +1070,11 @@ class Function:
         # if the second value is greater than the first
         value1, value2 = self._get_values_from_stack(2)
         if type(value1) != type(value2) or value1 is None:
-            exit(53)  # Error
+            raise OperandTypeError()
         value = value2 > value1
         self._replace_stack_value(value, 2)
 
-    def instr_eq(self, var: str, symb1: str, symb2: str) -> None:
+    def instr_eq(self, var: tuple, symb1: any, symb2: any) -> None:
         # Compares two symbs and sets the result to a given variable if values are equal
         value = self._operator(symb1, symb2, '==')
         self._set_value(var, value)
@@ -331,11 +1084,11 @@ class Function:
         # if values are equal
         value1, value2 = self._get_values_from_stack(2)
         if type(value1) != type(value2) and value1 is not None and value2 is not None:
-            exit(53)  # Error
+            raise OperandTypeError()
         value = value1 == value2
         self._replace_stack_value(value, 2)
 
-    def instr_and(self, var: str, symb1: str, symb2: str) -> None:
+    def instr_and(self, var: tuple, symb1: any, symb2: any) -> None:
         # Performs a logical AND operation on two symbs and sets the result to a variable
         value = self._operator(symb1, symb2, 'and')
         self._set_value(var, value)
@@ -344,11 +1097,11 @@ class Function:
         # Performs a logical AND operation on the top two values in the stack and replaces them with the result
         value1, value2 = self._get_values_from_stack(2)
         if not isinstance(value1, bool) or not isinstance(value2, bool):
-            exit(53)  # Error
+            raise OperandTypeError()
         value = value1 and value2
         self._replace_stack_value(value, 2)
 
-    def instr_or(self, var: str, symb1: str, symb2: str) -> None:
+    def instr_or(self, var: tuple, symb1: any, symb2: any) -> None:
         # Performs a logical OR operation on two symbs and sets the result to a variable
         value = self._operator(symb1, symb2, 'or')
         self._set_value(var, value)
@@ -357,78 +1110,78 @@ class Function:
         # Performs a logical OR operation on the top two values in the stack and replaces them with the result
         value1, value2 = self._get_values_from_stack(2)
         if not isinstance(value1, bool) or not isinstance(value2, bool):
-            exit(53)  # Error
+            raise OperandTypeError()
         value = value1 or value2
         self._replace_stack_value(value, 2)
 
-    def instr_not(self, var: str, symb1: str) -> None:
+    def instr_not(self, var: tuple, symb1: any) -> None:
         # Performs a logical NOT operation on a symb and sets the result to a variable
         value = self._get_value(symb1)
         if not isinstance(value, bool):
-            exit(53)  # Error
+            raise OperandTypeError()
         self._set_value(var, not bool(value))
 
     def instr_nots(self) -> None:
         # Performs a logical NOT operation on the top value in the stack and replaces it with the result
         value = self._get_values_from_stack(1)
         if not isinstance(value, bool):
-            exit(53)  # Error
+            raise OperandTypeError()
         value = not value
         self._replace_stack_value(value, 1)
 
-    def instr_int2char(self, var: str, symb: str) -> None:
+    def instr_int2char(self, var: tuple, symb: any) -> None:
         # Get the value of symb and check if it is an integer
         value = self._get_value(symb)
         if type(value) is not int:
-            exit(53)  # Error
+            raise OperandTypeError()
         try:
             # Convert the integer value to a character and set it to var
             self._set_value(var, chr(value))
         except ValueError:
-            exit(58)  # Error
+            raise StringError()
 
     def instr_int2chars(self) -> None:
         # Get the value from the top of the stack and check if it is an integer
         value = self._get_values_from_stack(1)
         if type(value) is not int:
-            exit(53)  # Error
+            raise OperandTypeError()
         try:
             # Convert the integer value to a character and replace it on the stack
             value = chr(value)
         except ValueError:
-            exit(58)  # Error
+            raise StringError()
         self._replace_stack_value(value, 1)
 
-    def instr_int2float(self, var: str, symb: str) -> None:
+    def instr_int2float(self, var: tuple, symb: any) -> None:
         # Get the value of symb and check if it is an integer
         value = self._get_value(symb)
         if type(value) is not int:
-            exit(53)  # Error
+            raise OperandTypeError()
         try:
             # Convert the integer value to a float and set it to var
             self._set_value(var, float(value))
         except ValueError:
-            exit(58)  # Error
+            raise StringError()
 
-    def instr_float2int(self, var: str, symb: str) -> None:
+    def instr_float2int(self, var: tuple, symb: any) -> None:
         # Get the value of symb and check if it is a float
         value = self._get_value(symb)
 
         if type(value) is not float:
-            exit(53)  # Error
+            raise OperandTypeError()
         try:
             # Convert the float value to an integer and set it to var
             self._set_value(var, int(value))
         except ValueError:
-            exit(58)  # Error
+            raise StringError()
 
-    def instr_stri2int(self, var: str, symb1: str, symb2: str) -> None:
+    def instr_stri2int(self, var: tuple, symb1: any, symb2: any) -> None:
         # Get the values of symb1 and symb2, and check their types
-        value, index = self._get_some_values(symb1, symb2)
-        if not isinstance(value, str) or type(index) is not int:
-            exit(53)  # Error
+        value, index = self._get_string(symb1), self._get_value(symb2)
+        if not isinstance(value, (str, StringBuffer)) or type(index) is not int:
+            raise OperandTypeError()
         elif index >= len(value):
-            exit(58)  # Error
+            raise StringError()
         # Convert the character at the given index to its ASCII code and set it to var
         self._set_value(var, str(ord(value[index])))
 
@@ -436,21 +1189,19 @@ class Function:
         # Get the values from the top of the stack, and check their types
         index, value = self._get_values_from_stack(2)
         if not isinstance(value, str) or type(index) is not int:
-            exit(53)  # Error
+            raise OperandTypeError()
         elif index >= len(value):
-            exit(58)  # Error
+            raise StringError()
         value = str(ord(value[index]))
         # Convert the character at the given index to its ASCII code and replace it on the stack
         self._replace_stack_value(value, 2)
 
-    def instr_read(self, var: str, type_: str) -> None:
-        # Read input from standard input or use stdin if input file provided
-        value = input() if self.stdin is None else self.stdin
-        # Remove newline character from input
-        value = value.replace('\n', '')
+    def instr_read(self, var: tuple, type_: str) -> None:
+        # Read the next line of input, the end of input is read as nil
+        value = self.input.readline()
 
         # Check if input is empty and set value to None if so
-        if value == '':
+        if value is None or value == '':
             value = None
         # Convert input to boolean if type is 'bool'
         elif type_ == 'bool':
@@ -470,62 +1221,63 @@ class Function:
         # Set the variable value
         self._set_value(var, value)
 
-    def instr_write(self, symb: str) -> None:
-        # Get the value of the symb
-        value = self._get_value(symb)
-        # Print the value depending on its type
-        if isinstance(value, bool):
-            print('true' if value else 'false', end='')
-        elif value is None:
-            print('', end='')
-        elif type(value) is float:
-            print(float.hex(value), end='')
-        else:
-            print(value, end='')
+    def instr_write(self, symb: any) -> None:
+        # Write the value of the symb to the buffered output
+        self.output.write(self._get_value(symb))
 
-    def instr_concat(self, var: str, symb1: str, symb2: str) -> None:
+    def instr_concat(self, var: tuple, symb1: any, symb2: any) -> None:
         # Concatenate the values of two symbs and set the result as the value of the variable
-        value = self._operator(symb1, symb2, '.')
-        self._set_value(var, value)
+        value1, value2 = self._get_string(symb1), self._get_value(symb2)
+        if not isinstance(value1, (str, StringBuffer)) or not isinstance(value2, str):
+            raise OperandTypeError()
+        self._set_value(var, self._concat(var, symb1, value1, value2))
 
-    def instr_strlen(self, var: str, symb: str) -> None:
+    def instr_strlen(self, var: tuple, symb: any) -> None:
         # Get the value of the symb and check that it is a string
-        value = self._get_value(symb)
-        if not isinstance(value, str):
-            exit(53)  # Error
+        value = self._get_string(symb)
+        if not isinstance(value, (str, StringBuffer)):
+            raise OperandTypeError()
         # Set the variable value to the length of the string
         self._set_value(var, len(value))
 
-    def instr_getchar(self, var: str, symb1: str, symb2: str) -> None:
+    def instr_getchar(self, var: tuple, symb1: any, symb2: any) -> None:
         # Get the values of the two symbs and check that they are of the correct types
-        value, index = self._get_some_values(symb1, symb2)
-        if type(index) is not int or not isinstance(value, str):
-            exit(53)  # Error
+        value, index = self._get_string(symb1), self._get_value(symb2)
+        if type(index) is not int or not isinstance(value, (str, StringBuffer)):
+            raise OperandTypeError()
         # Check that the index is within bounds
         elif index >= len(value):
-            exit(58)  # Error
+            raise StringError()
         # Set the variable value to the character at the specified index in the string
         self._set_value(var, value[index])
 
-    def instr_setchar(self, var: str, symb1: str, symb2: str) -> None:
+    def instr_setchar(self, var: tuple, symb1: any, symb2: any) -> None:
         # Get the values of the two symbs and check that they are of the correct types
         index, char = self._get_some_values(symb1, symb2)
-        var_value = self._get_value(var)
+        var_value = self._get_string(var)
         if type(index) is not int or not isinstance(char, str):
-            exit(53)  # Error
+            raise OperandTypeError()
         # Check that the index is within bounds
         elif index >= len(var_value):
-            exit(58)  # Error
-        # Replace the character at the specified index in the string with the new character
+            raise StringError()
+        # Replace the character at the specified index in the string with the new character,
+        # in place when the variable is (or becomes) a string buffer
+        if index >= 0 and len(char) == 1:
+            if type(var_value) is not StringBuffer:
+                var_value = StringBuffer(var_value)
+            var_value.setchar(index, char)
+            self._set_value(var, var_value)
+            return
+        var_value = str(var_value)
         value = var_value[:index] + char + var_value[index + 1:]
         self._set_value(var, value)
 
-    def instr_type(self, var: str, symb: str) -> None:
+    def instr_type(self, var: tuple, symb: any) -> None:
         # Dynamically detects the symb type and writes a string denoting that type to variable
-        value = self._get_value(symb)
+        value = self._get_string(symb)
         if type(value) is int:
             self._set_value(var, 'int')
-        if type(value) is str:
+        if type(value) is str or type(value) is StringBuffer:
             self._set_value(var, 'string')
         if type(value) is bool:
             self._set_value(var, 'bool')
@@ -533,93 +1285,190 @@ class Function:
             self._set_value(var, 'nil')
 
     def instr_label(self, label: str) -> None:
-        # Labels are placed in advance, pass is left so that there is no error
+        # Labels are resolved and removed from the executed program in advance,
+        # the handler is kept for the dispatch table
         pass
 
-    def instr_jump(self, label: str) -> None:
+    def instr_jump(self, label: int) -> None:
         # Jump instruction, which sets the program's position
-        # to the position of the specified label
-        if label not in self.labels:
-            exit(52)  # Error
-        self.position = self.labels[label]
+        # to the position resolved for the specified label
+        self.position = label
 
-    def instr_jumpifeq(self, label: str, symb1: str, symb2: str) -> None:
+    def instr_jumpifeq(self, label: int, symb1: any, symb2: any) -> None:
         # Jumps to the specified label if the values of the two specified symbs are equal
         value1, value2 = self._get_some_values(symb1, symb2)
         if type(value1) != type(value2) and value1 is not None and value2 is not None:
-            exit(53)  # Error
+            raise OperandTypeError()
         if value1 == value2:
-            self.instr_jump(label)
+            self.position = label
 
-    def instr_jumpifeqs(self, label: str) -> None:
+    def instr_jumpifeqs(self, label: int) -> None:
         # Jumps to the specified label if the values of the top two values on the stack are equal
         value2, value1 = self._get_values_from_stack(2)
         if type(value1) != type(value2) and value1 is not None and value2 is not None:
-            exit(53)  # Error
+            raise OperandTypeError()
         if value1 == value2:
-            self.instr_jump(label)
+            self.position = label
         self.stack.pop()
         self.stack.pop()
 
-    def instr_jumpifneq(self, label: str, symb1: str, symb2: str) -> None:
+    def instr_jumpifneq(self, label: int, symb1: any, symb2: any) -> None:
         # Jumps to the specified label if the values of the two specified symbs are not equal
         value1, value2 = self._get_some_values(symb1, symb2)
         if type(value1) != type(value2) and value1 is not None and value2 is not None:
-            exit(53)  # Error
+            raise OperandTypeError()
         if value1 != value2:
-            self.instr_jump(label)
+            self.position = label
 
-    def instr_jumpifneqs(self, label: str) -> None:
+    def instr_jumpifneqs(self, label: int) -> None:
         # Jumps to the specified label if the values of the top two values on the stack are not equal
         value2, value1 = self._get_values_from_stack(2)
         if type(value1) != type(value2) and value1 is not None and value2 is not None:
-            exit(53)  # Error
+            raise OperandTypeError()
         if value1 != value2:
-            self.instr_jump(label)
+            self.position = label
         self.stack.pop()
         self.stack.pop()
 
-    def instr_exit(self, symb: str) -> None:
+    def instr_exit(self, symb: any) -> None:
         # Exits program with a given value (must be an integer in range 0-49)
         value = self._get_value(symb)
         if type(value) is not int:
-            exit(53)  # Error
+            raise OperandTypeError()
         if value < 0 or value > 49:
-            exit(57)  # Error
-        exit(value)
+            raise OperandValueError()
+        raise ProgramExit(value)
 
-    def instr_dprint(self, symb: str) -> None:
+    def instr_dprint(self, symb: any) -> None:
         # Prints value of a given symb to standard error stream
         value = self._get_value(symb)
-        print(value, file=sys.stderr)
+        print(value, file=self.errors)
 
     def instr_break(self) -> None:
-        # Prints current position to standard error stream
-        print(self.position, file=sys.stderr)
+        # Prints current position (in the sorted source) to standard error stream
+        print(self.positions[self.position], file=self.errors)
+
+    # Handlers without dynamic type checks, used for sites whose operand types were proven by TypeInference
+    def fast_add(self, var: tuple, symb1: any, symb2: any) -> None:
+        # Add two symbs proven to be numbers of the same type
+        self._set_value(var, self._get_value(symb1) + self._get_value(symb2))
+
+    def fast_sub(self, var: tuple, symb1: any, symb2: any) -> None:
+        # Subtract two symbs proven to be numbers of the same type
+        self._set_value(var, self._get_value(symb1) - self._get_value(symb2))
+
+    def fast_mul(self, var: tuple, symb1: any, symb2: any) -> None:
+        # Multiply two symbs proven to be numbers of the same type
+        self._set_value(var, self._get_value(symb1) * self._get_value(symb2))
+
+    def fast_div(self, var: tuple, symb1: any, symb2: any) -> None:
+        # Divide two symbs proven to be numbers of the same type
+        value1, value2 = self._get_value(symb1), self._get_value(symb2)
+        if value2 == 0:
+            raise OperandValueError()
+        self._set_value(var, value1 / value2)
+
+    def fast_idiv(self, var: tuple, symb1: any, symb2: any) -> None:
+        # Integer divide two symbs proven to be numbers of the same type
+        value1, value2 = self._get_value(symb1), self._get_value(symb2)
+        if value2 == 0:
+            raise OperandValueError()
+        self._set_value(var, value1 // value2)
+
+    def fast_lt(self, var: tuple, symb1: any, symb2: any) -> None:
+        # Compare two symbs proven to be of the same comparable type by less than
+        self._set_value(var, self._get_value(symb1) < self._get_value(symb2))
+
+    def fast_gt(self, var: tuple, symb1: any, symb2: any) -> None:
+        # Compare two symbs proven to be of the same comparable type by greater than
+        self._set_value(var, self._get_value(symb1) > self._get_value(symb2))
+
+    def fast_eq(self, var: tuple, symb1: any, symb2: any) -> None:
+        # Compare two symbs proven to be of the same type or nil for equality
+        self._set_value(var, self._get_value(symb1) == self._get_value(symb2))
+
+    def fast_and(self, var: tuple, symb1: any, symb2: any) -> None:
+        # Logical AND of two symbs proven to be booleans
+        self._set_value(var, self._get_value(symb1) and self._get_value(symb2))
+
+    def fast_or(self, var: tuple, symb1: any, symb2: any) -> None:
+        # Logical OR of two symbs proven to be booleans
+        self._set_value(var, self._get_value(symb1) or self._get_value(symb2))
+
+    def fast_not(self, var: tuple, symb1: any) -> None:
+        # Logical NOT of a symb proven to be a boolean
+        self._set_value(var, not self._get_value(symb1))
+
+    def fast_concat(self, var: tuple, symb1: any, symb2: any) -> None:
+        # Concatenate two symbs proven to be strings
+        self._set_value(var, self._concat(var, symb1, self._get_string(symb1), self._get_value(symb2)))
+
+    def fast_strlen(self, var: tuple, symb: any) -> None:
+        # Length of a symb proven to be a string
+        self._set_value(var, len(self._get_string(symb)))
+
+    def fast_getchar(self, var: tuple, symb1: any, symb2: any) -> None:
+        # Character of a symb proven to be a string at an index proven to be an int
+        value, index = self._get_string(symb1), self._get_value(symb2)
+        if index >= len(value):
+            raise StringError()
+        self._set_value(var, value[index])
 
-    # Secondary functions
-    def _get_value(self, symb: str) -> any:
-        # This method retrieves a value from a given symbl string
-        value = symb.split('@', 1)
-        # Possible types are 'GF', 'LF', 'TF', 'int', 'bool', 'nil', 'float'
-        if value[0] in {'GF', 'LF', 'TF'}:
-            if value[0] not in self.frames or self.frames[value[0]] is None:
-                # Raises errors if the frame or variable does not exist, or if the value is not in a valid format
-                exit(55)  # Error
-            elif value[1] not in self.frames[value[0]]:
-                exit(54)  # Error
-            return self.frames[value[0]][value[1]]
-        elif value[0] == 'int':
-            return int(value[1])
-        elif value[0] == 'bool':
-            return value[1].lower() == 'true'
-        elif value[0] == 'nil':
-            return None
-        elif value[0] == 'float':
-            return float(value[1])
-        return value[1]
+    def fast_jumpifeq(self, label: int, symb1: any, symb2: any) -> None:
+        # Jump to the label if two symbs proven to be of the same type or nil are equal
+        if self._get_value(symb1) == self._get_value(symb2):
+            self.position = label
+
+    def fast_jumpifneq(self, label: int, symb1: any, symb2: any) -> None:
+        # Jump to the label if two symbs proven to be of the same type or nil are not equal
+        if self._get_value(symb1) != self._get_value(symb2):
+            self.position = label
 
-    def _get_some_values(self, *args: str) -> list:
+    # Secondary functions
+    def _get_value(self, symb: any) -> any:
+        # This method retrieves a value from a decoded symb,
+        # variables are (frame, slot) tuples and everything else is already a constant value
+        if type(symb) is not tuple:
+            return symb
+        frame = self.frames[symb[0]]
+        if frame is None:
+            # Raises errors if the frame or variable does not exist
+            raise FrameError()
+        try:
+            value = frame[symb[1]]
+        except IndexError:
+            raise UndefinedVariableError()
+        if value is UNDEFINED:
+            raise UndefinedVariableError()
+        if type(value) is StringBuffer:
+            return str(value)
+        return value
+
+    def _get_string(self, symb: any) -> any:
+        # Retrieve a value like _get_value, but a string buffer is returned as it is without joining it
+        if type(symb) is tuple:
+            frame = self.frames[symb[0]]
+            if frame is not None and symb[1] < len(frame) and type(frame[symb[1]]) is StringBuffer:
+                return frame[symb[1]]
+        return self._get_value(symb)
+
+    def _concat(self, var: tuple, symb1: any, value1: any, value2: str) -> any:
+        # Concatenate two strings, a variable extended by itself keeps a string buffer that is appended in place,
+        # buffers never leave their variable, every other read gets a plain string
+        if var == symb1:
+            if type(value1) is not StringBuffer:
+                value1 = StringBuffer(value1)
+            value1.append(value2)
+            return value1
+        return str(value1) + value2
+
+    def _discard_tf(self) -> None:
+        # Stop counting the variables of the temporary frame that is about to be replaced
+        frame = self.frames[TF]
+        if frame is not None:
+            self.var_count -= frame[DEFINED]
+
+    def _get_some_values(self, *args: any) -> list:
         # Returns a list of values obtained by getting the values of each argument using _get_value()
         return [self._get_value(arg) for arg in args]
 
@@ -635,156 +1484,1259 @@ class Function:
             self.stack.pop()
         self.stack.append(value)
 
-    def _set_value(self, var: str, value: any) -> None:
+    def _set_value(self, var: tuple, value: any) -> None:
         # Set the value of the variable
-        var_frame, var_name = self._var_split(var)
-        if var_frame not in self.frames:
-            exit(55)  # Error
-        elif var_name not in self.frames[var_frame]:
-            exit(54)  # Error
-        self.frames[var_frame][var_name] = value
+        frame = self.frames[var[0]]
+        if frame is None:
+            raise FrameError()
+        try:
+            if frame[var[1]] is UNDEFINED:
+                raise UndefinedVariableError()
+        except IndexError:
+            raise UndefinedVariableError()
+        frame[var[1]] = value
 
     # Redesign
-    def _operator(self, symb1: str, symb2: str, op: str) -> any:
+    def _operator(self, symb1: any, symb2: any, op: str) -> any:
         #  It retrieves the values associated with these symbs using the _get_some_values method
         #  and performs an operation based on the operator provided
         value1, value2 = self._get_some_values(symb1, symb2)
 
         if op in {'+', '-', '*'}:
             if type(value1) != type(value2) or type(value1) not in (int, float) or type(value2) not in (int, float):
-                exit(53)  # Error
-            return eval(f'value1 {op} value2')
+                raise OperandTypeError()
+            return self.OPERATORS[op](value1, value2)
         if op in {'<', '>'}:
             if type(value1) != type(value2) or value1 is None:
-                exit(53)  # Error
-            return eval(f'value1 {op} value2')
+                raise OperandTypeError()
+            return self.OPERATORS[op](value1, value2)
         if op == '==':
             if type(value1) != type(value2) and value1 is not None and value2 is not None:
-                exit(53)  # Error
+                raise OperandTypeError()
             return value1 == value2
         elif op == '//':
             if type(value1) != type(value2) or type(value1) not in (int, float) or type(value2) not in (int, float):
-                exit(53)  # Error
+                raise OperandTypeError()
             elif value2 == 0:
-                exit(57)  # Error
+                raise OperandValueError()
             return value1 // value2
         elif op == '/':
             if type(value1) != type(value2) or type(value1) not in (int, float) or type(value2) not in (int, float):
-                exit(53)  # Error
+                raise OperandTypeError()
             elif value2 == 0:
-                exit(57)  # Error
+                raise OperandValueError()
             return value1 / value2
-        elif op == '.':
-            if not isinstance(value1, str) or not isinstance(value2, str):
-                exit(53)  # Error
-            return value1 + value2
         elif op in {'and', 'or'}:
             if not isinstance(value1, bool) or not isinstance(value2, bool):
-                exit(53)  # Error
-            return eval(f'value1 {op} value2')
+                raise OperandTypeError()
+            return self.OPERATORS[op](value1, value2)
+
+
+class AdaptiveFunction(Function):
+    """
+    Function class with adaptive specialization of arithmetic, relational and logical instructions
+    """
+    # Operation and operand types every adaptive opcode can be specialized for
+    SPECIALIZATIONS = {
+        'ADD': (operator.add, (int, float)),
+        'SUB': (operator.sub, (int, float)),
+        'MUL': (operator.mul, (int, float)),
+        'LT': (operator.lt, (int, float, str, bool)),
+        'GT': (operator.gt, (int, float, str, bool)),
+        'EQ': (operator.eq, (int, float, str, bool)),
+        'AND': (operator.and_, (bool,)),
+        'OR': (operator.or_, (bool,)),
+    }
+    # Number of guard failures after which a site goes back to the generic handler for good
+    MAX_MISSES = 16
+
+    # Every site starts with the adaptive handler, which rewrites itself in self.code on first execution
+    def instr_add(self, var: tuple, symb1: any, symb2: any) -> None:
+        self._adapt('ADD', var, symb1, symb2)
+
+    def instr_sub(self, var: tuple, symb1: any, symb2: any) -> None:
+        self._adapt('SUB', var, symb1, symb2)
+
+    def instr_mul(self, var: tuple, symb1: any, symb2: any) -> None:
+        self._adapt('MUL', var, symb1, symb2)
+
+    def instr_lt(self, var: tuple, symb1: any, symb2: any) -> None:
+        self._adapt('LT', var, symb1, symb2)
+
+    def instr_gt(self, var: tuple, symb1: any, symb2: any) -> None:
+        self._adapt('GT', var, symb1, symb2)
+
+    def instr_eq(self, var: tuple, symb1: any, symb2: any) -> None:
+        self._adapt('EQ', var, symb1, symb2)
+
+    def instr_and(self, var: tuple, symb1: any, symb2: any) -> None:
+        self._adapt('AND', var, symb1, symb2)
+
+    def instr_or(self, var: tuple, symb1: any, symb2: any) -> None:
+        self._adapt('OR', var, symb1, symb2)
+
+    # Secondary functions
+    def _adapt(self, opcode: str, var: tuple, symb1: any, symb2: any) -> None:
+        # Observe the operand types of the current site, rewrite the site to a specialized handler
+        # if both have the same supported type and execute the generic handler this time
+        operation, types = self.SPECIALIZATIONS[opcode]
+        generic = getattr(Function, f'instr_{opcode.lower()}').__get__(self)
+        value_type = type(self._get_value(symb1))
+        if value_type in types and type(self._get_value(symb2)) is value_type:
+            handler = self._specialize(self.position, operation, value_type, generic)
+        else:
+            handler = generic
+        self.code[self.position] = (handler, (var, symb1, symb2))
+        generic(var, symb1, symb2)
+
+    def _specialize(self, position: int, operation: any, value_type: type, generic: any) -> any:
+        # Create the handler of one site specialized for operands of value_type,
+        # operands of other types fall back to the generic handler with all its checks
+        get_value = self._get_value
+        set_value = self._set_value
+        code = self.code
+        misses = 0
+
+        def specialized(var: tuple, symb1: any, symb2: any) -> None:
+            nonlocal misses
+            value1 = get_value(symb1)
+            value2 = get_value(symb2)
+            if type(value1) is value_type and type(value2) is value_type:
+                set_value(var, operation(value1, value2))
+                return
+            misses += 1
+            if misses >= self.MAX_MISSES:
+                code[position] = (generic, code[position][1])
+            generic(var, symb1, symb2)
+
+        return specialized
+
+
+class CompiledFunction(Function):
+    """
+    Function class executing programs compiled to Python functions, one function per basic block
+    """
+    # Instructions ending a basic block
+    CONTROL = {'JUMP', 'JUMPIFEQ', 'JUMPIFNEQ', 'JUMPIFEQS', 'JUMPIFNEQS', 'CALL', 'RETURN', 'EXIT'}
+    # Instructions with an inline fast path, the operators and the operand types the fast path is taken for
+    INLINE = {
+        'ADD': ('+', ('int', 'float')),
+        'SUB': ('-', ('int', 'float')),
+        'MUL': ('*', ('int', 'float')),
+        'LT': ('<', ('int', 'float', 'str', 'bool')),
+        'GT': ('>', ('int', 'float', 'str', 'bool')),
+        'EQ': ('==', ('int', 'float', 'str', 'bool')),
+        'AND': ('and', ('bool',)),
+        'OR': ('or', ('bool',)),
+        'JUMPIFEQ': ('==', ('int', 'float', 'str', 'bool')),
+        'JUMPIFNEQ': ('!=', ('int', 'float', 'str', 'bool')),
+    }
+    # Longer straight-line code is split into more blocks, which keeps the generated functions small
+    MAX_BLOCK = 64
+    # Number of executions after which a block is compiled, colder blocks are interpreted
+    HOT = 32
+    # Compiled code objects of the generated block sources
+    compiled = {}
+    MAX_COMPILED = 4096
+    # CALL targets whose calls go through the memoizing handler
+    memoized = frozenset()
+    # Positions of the instructions executed by every line of the compiled block functions, keyed by their code
+    block_lines = {}
+
+    def execute(self, program: Program, code: list, counts: list = None) -> None:
+        # Run the bound program block by block, every block function returns the index of the next block
+        # or -1 at the end of the program, blocks start interpreted and are compiled once they get hot,
+        # execution counts of the blocks are converted to counts of the positions if counts is given
+        starts = sorted(self._leaders(program))
+        blocks = {start: num for num, start in enumerate(starts)}
+        resume = [blocks.get(position, -1) for position in range(len(program) + 1)]
+        ends = starts[1:] + [len(program)]
+        block_counts = [0] * len(starts)
+        context = (program, code, resume, block_counts, counts is not None)
+        functions = []
+        functions.extend(self._cold(context, functions, num, starts[num], ends[num]) for num in range(len(starts)))
+
+        block = resume[0]
+        try:
+            while block >= 0:
+                block = functions[block]()
+        finally:
+            if counts is not None:
+                for num, start in enumerate(starts):
+                    for position in range(start, ends[num]):
+                        counts[position] = block_counts[num]
+
+    def current_position(self, frame: any = None) -> int:
+        # Position of the instruction being executed, compiled blocks set the position only for the instructions
+        # that need it, so the position is found from the line executed by the block function in the frame stack
+        while frame is not None:
+            lines = self.block_lines.get(frame.f_code)
+            if lines is not None:
+                return lines[frame.f_lineno - 1]
+            frame = frame.f_back
+        return self.position
+
+    # Secondary functions
+    def _cold(self, context: tuple, functions: list, num: int, start: int, end: int) -> any:
+        # Create the function of a block which is interpreted until it is executed HOT times,
+        # then it replaces itself by the compiled block
+        program, code, resume, block_counts, counted = context
+
+        def block() -> int:
+            block_counts[num] += 1
+            if block_counts[num] >= self.HOT:
+                functions[num] = self._compile(context, num, start, end)
+            position = self.position = start
+            while True:
+                handler, operands = code[position]
+                handler(*operands)
+                if self.position != position:
+                    return resume[self.position + 1]
+                position += 1
+                if position == end:
+                    return resume[end]
+                self.position = position
+
+        return block
+
+    def _compile(self, context: tuple, num: int, start: int, end: int) -> any:
+        # Compile the block and return its function, the code objects are shared by equal blocks
+        program, code, resume, block_counts, counted = context
+        source, lines = self._source(program, num, start, end, resume, counted)
+        if source not in self.compiled:
+            if len(self.compiled) >= self.MAX_COMPILED:
+                self.compiled.clear()
+                self.block_lines.clear()
+            self.compiled[source] = compile(source, '<ippcode23>', 'exec')
+        namespace = {}
+        exec(self.compiled[source], namespace)
+        block = namespace['make'](self, self.frames, self.frames[GF], self.call_stack, code, UNDEFINED, StringBuffer,
+                                  resume, block_counts)
+        self.block_lines[block.__code__] = lines
+        return block
+
+    def _leaders(self, program: Program) -> set:
+        # First positions of the basic blocks: the start, jump targets, positions following a control instruction
+        # and every MAX_BLOCK-th position of longer straight-line code
+        leaders = {0} if len(program) else set()
+        for position, (opcode, kinds) in enumerate(zip(program.opcodes, program.kinds)):
+            if kinds[:1] == ('label',) and program.operands[position][0] + 1 < len(program):
+                leaders.add(program.operands[position][0] + 1)
+            if opcode.upper() in self.CONTROL and position + 1 < len(program):
+                leaders.add(position + 1)
+        start = 0
+        for position in range(len(program)):
+            if position in leaders or position - start >= self.MAX_BLOCK:
+                leaders.add(position)
+                start = position
+        return leaders
+
+    def _source(self, program: Program, num: int, start: int, end: int, resume: list, counted: bool) -> tuple:
+        # Generate the source of the maker of a block function, which binds the handlers and operands of the block,
+        # and the position of the instruction of every source line
+        lines = ['def make(f, frames, gf, cs, C, U, SB, R, BC):']
+        for position in range(start, end):
+            operands = program.operands[position]
+            if operands:
+                names = ', '.join(f'o{position}_{index}' for index in range(len(operands)))
+                lines.append(f'    h{position}, ({names},) = C[{position}]')
+            else:
+                lines.append(f'    h{position} = C[{position}][0]')
+        lines.append('    def block():')
+        lines.append(f'        f.position = {start}')
+        if counted:
+            lines.append(f'        BC[{num}] += 1')
+        positions = [start] * len(lines)
+        for position in range(start, end):
+            instruction = self._instruction(program, position, resume)
+            lines.extend(instruction)
+            positions.extend([position] * len(instruction))
+        # Blocks not ending by an unconditional transfer fall through to the next one
+        if program.opcodes[end - 1].upper() not in {'JUMP', 'CALL', 'RETURN', 'EXIT'}:
+            lines.append(f'        return {resume[end]}')
+        lines.append('    return block')
+        positions += [end - 1] * (len(lines) - len(positions))
+        return '\n'.join(lines) + '\n', positions
+
+    def _instruction(self, program: Program, position: int, resume: list) -> list:
+        # Generate the lines of one instruction, the generic call executes the bound handler with all its checks
+        opcode = program.opcodes[position].upper()
+        operands = program.operands[position]
+        generic = f'h{position}({", ".join(f"o{position}_{num}" for num in range(len(operands)))})'
+        indent = ' ' * 8
+        if opcode == 'JUMP':
+            return [f'{indent}return {resume[operands[0] + 1]}']
+        if opcode == 'CALL' and operands[0] in self.memoized:
+            return [f'{indent}f.position = {position}', f'{indent}{generic}', f'{indent}return R[f.position + 1]']
+        if opcode == 'CALL':
+            return [f'{indent}cs.append({position})', f'{indent}return {resume[operands[0] + 1]}']
+        if opcode == 'RETURN':
+            return [f'{indent}{generic}', f'{indent}return R[f.position + 1]']
+        if opcode in {'JUMPIFEQS', 'JUMPIFNEQS'}:
+            return [f'{indent}f.position = {position}', f'{indent}{generic}',
+                    f'{indent}if f.position != {position}:', f'{indent}    return {resume[operands[0] + 1]}']
+        if opcode == 'BREAK':
+            return [f'{indent}f.position = {position}', f'{indent}{generic}']
+        if opcode in self.INLINE:
+            lines = self._inline(opcode, operands, generic, position, resume)
+            if lines is not None:
+                return [indent + line for line in lines]
+        if opcode == 'MOVE' and type(operands[1]) is tuple:
+            return [indent + line for line in self._move(operands, generic)]
+        if opcode in {'JUMPIFEQ', 'JUMPIFNEQ'}:
+            return [f'{indent}f.position = {position}', f'{indent}{generic}',
+                    f'{indent}if f.position != {position}:', f'{indent}    return {resume[operands[0] + 1]}']
+        return [indent + generic]
+
+    def _inline(self, opcode: str, operands: tuple, generic: str, position: int, resume: list) -> any:
+        # Generate the fast path of an inlined instruction guarded by the operand types,
+        # operands of other types, missing variables and frames take the generic call
+        operation, types = self.INLINE[opcode]
+        symbs = operands[1:]
+        if all(type(symb) is not tuple for symb in symbs):
+            return None
+        constant_types = {type(symb).__name__ for symb in symbs if type(symb) is not tuple}
+        if len(constant_types) > 1 or not constant_types <= set(types):
+            return None
+
+        reads = [self._ref(symb) if type(symb) is tuple else self._literal(symb) for symb in symbs]
+        if constant_types:
+            value_type = constant_types.pop()
+            guard = ' and '.join(f'type(v{num}) is {value_type}' for num, symb in enumerate(symbs)
+                                 if type(symb) is tuple)
+        else:
+            guard = 'type(v0) is type(v1) and (' + ' or '.join(f'type(v0) is {name}' for name in types) + ')'
+        lines = ['try:'] + [f'    v{num} = {read}' for num, read in enumerate(reads)]
+        expression = f'v0 {operation} v1'
+        if opcode.startswith('JUMP'):
+            target = resume[operands[0] + 1]
+            lines += [f'    ok = {guard}', 'except (IndexError, TypeError):', '    ok = False',
+                      'if ok:', f'    if {expression}:', f'        return {target}',
+                      'else:', f'    f.position = {position}', f'    {generic}',
+                      f'    if f.position != {position}:', f'        return {target}']
+            return lines
+        dest = self._ref(operands[0])
+        lines += [f'    ok = {guard} and {dest} is not U', 'except (IndexError, TypeError):', '    ok = False',
+                  'if ok:', f'    {dest} = {expression}', 'else:', f'    {generic}']
+        return lines
+
+    def _move(self, operands: tuple, generic: str) -> list:
+        # Generate MOVE of a variable, string buffers are left to the generic call which joins them
+        dest, source = self._ref(operands[0]), self._ref(operands[1])
+        return ['try:', f'    v0 = {source}', f'    ok = v0 is not U and type(v0) is not SB and {dest} is not U',
+                'except (IndexError, TypeError):', '    ok = False',
+                'if ok:', f'    {dest} = v0', 'else:', f'    {generic}']
+
+    @staticmethod
+    def _ref(var: tuple) -> str:
+        # Expression of a variable slot, a missing frame is None and raises TypeError when indexed
+        frame, slot = var
+        return f'gf[{slot}]' if frame == GF else f'frames[{frame}][{slot}]'
+
+    @staticmethod
+    def _literal(value: any) -> str:
+        # Expression of a constant
+        if type(value) is float and (value != value or value in (float('inf'), float('-inf'))):
+            return f"float('{value}')"
+        return repr(value)
+
+
+class Optimizer:
+    """
+    Program optimizer class
+    """
+    # Instructions computing their variable only from their symbs, they can be folded into MOVE
+    FOLDABLE = {'ADD', 'SUB', 'MUL', 'DIV', 'IDIV', 'LT', 'GT', 'EQ', 'AND', 'OR', 'NOT', 'INT2CHAR', 'INT2FLOAT',
+                'FLOAT2INT', 'STRI2INT', 'CONCAT', 'STRLEN', 'GETCHAR', 'TYPE'}
+    CONTROL = {'JUMP', 'JUMPIFEQ', 'JUMPIFNEQ', 'JUMPIFEQS', 'JUMPIFNEQS', 'CALL', 'RETURN', 'EXIT'}
+    KINDS = {int: 'int', float: 'float', str: 'string', bool: 'bool', type(None): 'nil'}
+
+    def __init__(self, program: Program) -> None:
+        # Initialize the optimizer of a compiled program, the program itself is not modified
+        self.program = program
+        self.signatures = Function.signatures()
+        # Function used to evaluate constant instructions with exactly the same semantics and checks
+        self.scratch = Function(None)
+
+    def run(self) -> Program:
+        # Return the optimized program: constant expressions are folded, constants are propagated
+        # within basic blocks and unreachable instructions are removed, orders of the remaining
+        # instructions stay the same, so the statistics refer to the source program
+        program = Program([])
+        for field in Program.FIELDS:
+            value = getattr(self.program, field)
+            setattr(program, field, list(value) if isinstance(value, list) else value)
+        self._propagate(program)
+        self._remove_unreachable(program)
+        return program
+
+    # Secondary functions
+    def _propagate(self, program: Program) -> None:
+        # Replace variables with known constant values and fold instructions whose symbs are all constants
+        leaders = {operands[0] + 1 for kinds, operands in zip(program.kinds, program.operands)
+                   if kinds[:1] == ('label',)}
+        constants = {}
+        for position in range(len(program)):
+            if position in leaders:
+                constants = {}
+            opcode = program.opcodes[position].upper()
+            params = self.signatures[opcode][1]
+            kinds = list(program.kinds[position])
+            operands = list(program.operands[position])
+            for num, param in enumerate(params):
+                if param == 'symb' and kinds[num] == 'var' and operands[num] in constants:
+                    operands[num] = constants[operands[num]]
+                    kinds[num] = self.KINDS[type(operands[num])]
+
+            symbs = [operand for param, operand in zip(params, operands) if param == 'symb']
+            folded = all(type(operand) is not tuple for operand in symbs)
+            if folded and opcode in self.FOLDABLE:
+                value = self._evaluate(opcode, operands)
+                if value is not UNDEFINED:
+                    opcode, kinds, operands = 'MOVE', ['var', self.KINDS[type(value)]], [operands[0], value]
+            elif folded and opcode in {'JUMPIFEQ', 'JUMPIFNEQ'} and self._taken(opcode, operands):
+                opcode, kinds, operands = 'JUMP', ['label'], [operands[0]]
+            if opcode != program.opcodes[position].upper():
+                program.opcodes[position] = opcode
+            program.kinds[position] = tuple(kinds)
+            program.operands[position] = tuple(operands)
+
+            # Update the known constants by what the instruction writes
+            if opcode in self.CONTROL:
+                constants = {}
+            elif opcode in {'CREATEFRAME', 'PUSHFRAME', 'POPFRAME'}:
+                constants = {var: value for var, value in constants.items() if var[0] == GF}
+            elif params[:1] == ('var',):
+                constants.pop(operands[0], None)
+                if opcode == 'MOVE' and type(operands[1]) is not tuple:
+                    constants[operands[0]] = operands[1]
+                elif opcode == 'DEFVAR':
+                    constants[operands[0]] = None
+
+    def _evaluate(self, opcode: str, operands: list) -> any:
+        # Execute the instruction with constant symbs, return UNDEFINED if it fails or keeps its variable
+        scratch = self.scratch
+        scratch.frames[GF] = [1, scratch]
+        try:
+            getattr(scratch, self.signatures[opcode][0])((GF, 1), *operands[1:])
+        except (InterpretError, ArithmeticError, ValueError):
+            # Errors are left to the runtime, which reports them by their code only if the instruction is executed
+            return UNDEFINED
+        value = scratch.frames[GF][1]
+        return UNDEFINED if value is scratch else value
+
+    def _taken(self, opcode: str, operands: list) -> bool:
+        # Check if a conditional jump with constant symbs is always taken without an error
+        scratch = self.scratch
+        scratch.position = -1
+        try:
+            getattr(scratch, self.signatures[opcode][0])(*operands)
+        except (InterpretError, ArithmeticError, ValueError):
+            return False
+        return scratch.position != -1
+
+    def _remove_unreachable(self, program: Program) -> None:
+        # Remove instructions which cannot be reached from the start and renumber the jump targets
+        size = len(program)
+        reachable = [False] * size
+        worklist = [0] if size else []
+        while worklist:
+            position = worklist.pop()
+            if position >= size or reachable[position]:
+                continue
+            reachable[position] = True
+            worklist.extend(program.successors(position))
+            if program.opcodes[position].upper() == 'CALL':
+                worklist.append(position + 1)
+        if all(reachable):
+            return
+
+        # Number of kept instructions before every position
+        kept_before = []
+        kept = 0
+        for position in range(size + 1):
+            kept_before.append(kept)
+            if position < size and reachable[position]:
+                kept += 1
+        for position in range(size):
+            if reachable[position] and program.kinds[position][:1] == ('label',):
+                operands = list(program.operands[position])
+                operands[0] = kept_before[operands[0] + 1] - 1
+                program.operands[position] = tuple(operands)
+        program.labels = {label: kept_before[target + 1] - 1 for label, target in program.labels.items()}
+        for field in ('orders', 'opcodes', 'kinds', 'operands', 'positions'):
+            values = getattr(program, field)
+            setattr(program, field, [value for value, keep in zip(values, reachable) if keep])
+
+
+class Memoizer:
+    """
+    Memoization class of pure functions
+    """
+    # Instructions with effects outside of the frames and the data stack of a call
+    IMPURE = {'READ', 'WRITE', 'EXIT', 'DPRINT', 'BREAK', 'CLEARS'}
+    # Number of values popped and pushed by the data stack instructions
+    STACK = {
+        'PUSHS': (0, 1), 'POPS': (1, 0), 'NOTS': (1, 1), 'INT2CHARS': (1, 1),
+        'ADDS': (2, 1), 'SUBS': (2, 1), 'MULS': (2, 1), 'IDIVS': (2, 1), 'LTS': (2, 1), 'GTS': (2, 1),
+        'EQS': (2, 1), 'ANDS': (2, 1), 'ORS': (2, 1), 'STRI2INTS': (2, 1), 'JUMPIFEQS': (2, 0), 'JUMPIFNEQS': (2, 0),
+    }
+    # Statistics groups of the cache
+    STATS = {'memo-hits', 'memo-misses'}
+    SIZE = 65536
+    # Rounds of the computation of the stack effects of recursive functions
+    MAX_ROUNDS = 32
+
+    def __init__(self, program: Program, size: int = SIZE) -> None:
+        # Initialize the memoization of a compiled program with a cache of at most size results
+        self.program = program
+        self.size = size
+        self.function = None
+        # Number of data stack values read by every memoized CALL target
+        self.reads = {}
+        # Results keyed by the target, the temporary frame and the data stack values read by the call,
+        # the dictionary order is the order of the last use
+        self.cache = {}
+        # Calls which will store their result when they return, with the call depth, key and stack base
+        self.pending = []
+        self.hits = 0
+        self.misses = 0
+
+    def run(self) -> dict:
+        # Find the CALL targets which only use their temporary and local frames and the data stack and
+        # return the number of data stack values read by every one of them
+        program = self.program
+        candidates = {operands[0] for opcode, operands in zip(program.opcodes, program.operands)
+                      if opcode.upper() == 'CALL'}
+        # Stack effects (the lowest and the final depth relative to the call) of functions returning on some path,
+        # paths calling a function without a known effect are ignored until it is known
+        effects = {}
+        changed = True
+        while changed:
+            changed = False
+            for target in sorted(candidates - effects.keys()):
+                effect = self._effect(target, candidates, effects, final=False)
+                if effect is False:
+                    candidates.discard(target)
+                    changed = True
+                elif effect is not None:
+                    effects[target] = effect
+                    changed = True
+
+        # Every path of every function has to agree with the effects of the functions it calls
+        for _ in range(self.MAX_ROUNDS):
+            changed = False
+            for target in sorted(candidates):
+                effect = self._effect(target, candidates, effects, final=True)
+                if effect is False:
+                    candidates.discard(target)
+                    effects.pop(target, None)
+                    changed = True
+                elif effect != effects.get(target):
+                    effects[target] = effect
+                    changed = True
+            if not changed:
+                self.reads = {target: -effects[target][0] for target in candidates}
+                break
+        return self.reads
+
+    def bind(self, function: Function, code: list) -> None:
+        # Replace the handlers of CALL instructions of memoized targets and of all RETURN instructions
+        self.function = function
+        for position, opcode in enumerate(self.program.opcodes):
+            opcode = opcode.upper()
+            if opcode == 'CALL' and self.program.operands[position][0] in self.reads:
+                code[position] = (self.call, code[position][1])
+            elif opcode == 'RETURN':
+                code[position] = (self.ret, ())
+
+    def call(self, label: int) -> None:
+        # Call a memoized function, a cached result replaces the temporary frame and the data stack values
+        # read by the call without executing it
+        function = self.function
+        stack = function.stack
+        base = len(stack) - self.reads[label]
+        if base < 0:
+            # The callee fails on the missing values
+            function.instr_call(label)
+            return
+        key = (label, self._freeze(function.frames[TF]), self._freeze(stack[base:]))
+        result = self.cache.pop(key, None)
+        if result is None:
+            self.misses += 1
+            self.pending.append((len(function.call_stack), key, base))
+            function.instr_call(label)
+            return
+
+        self.hits += 1
+        self.cache[key] = result
+        frame, values = result
+        function._discard_tf()
+        if frame is None:
+            function.frames[TF] = None
+        else:
+            function.frames[TF] = list(frame)
+            function.var_count += frame[DEFINED]
+            if function.var_count > function.max_vars:
+                function.max_vars = function.var_count
+        del stack[base:]
+        stack.extend(values)
+
+    def ret(self) -> None:
+        # Return from a function call and store the result if it ends a memoized call
+        function = self.function
+        function.instr_return()
+        if self.pending and self.pending[-1][0] == len(function.call_stack):
+            _, key, base = self.pending.pop()
+            frame = function.frames[TF]
+            if frame is not None:
+                frame = tuple(str(value) if type(value) is StringBuffer else value for value in frame)
+            if len(self.cache) >= self.size:
+                del self.cache[next(iter(self.cache))]
+            self.cache[key] = (frame, tuple(function.stack[base:]))
+
+    # Secondary functions
+    def _effect(self, target: int, candidates: set, effects: dict, final: bool) -> any:
+        # Return the lowest and the final data stack depth of the function relative to the call,
+        # False if it is not pure, or None if no path returns yet; the frame depth and the stack depth
+        # of every position must not depend on the path and all frames pushed by the function must be popped
+        program = self.program
+        start = target + 1
+        states = {start: (0, 0)}
+        worklist = [start]
+        lowest = 0
+        returns = set()
+        while worklist:
+            position = worklist.pop()
+            if position >= len(program):
+                return False
+            frames, depth = states[position]
+            opcode = program.opcodes[position].upper()
+            operands = program.operands[position]
+            if opcode in self.IMPURE:
+                return False
+            for kind, operand in zip(program.kinds[position], operands):
+                # The global frame and the local frame of the caller are not part of the key
+                if kind == 'var' and (operand[0] == GF or (operand[0] == LF and frames == 0)):
+                    return False
+
+            successors = program.successors(position)
+            if opcode == 'PUSHFRAME':
+                frames += 1
+            elif opcode == 'POPFRAME':
+                if frames == 0:
+                    return False
+                frames -= 1
+            elif opcode in self.STACK:
+                pops, pushes = self.STACK[opcode]
+                lowest = min(lowest, depth - pops)
+                depth += pushes - pops
+            elif opcode == 'RETURN':
+                if frames:
+                    return False
+                returns.add(depth)
+            elif opcode == 'CALL':
+                callee = operands[0]
+                if callee not in candidates:
+                    return False
+                if callee not in effects:
+                    if final:
+                        return False
+                    continue
+                lowest = min(lowest, depth + effects[callee][0])
+                depth += effects[callee][1]
+                successors = [position + 1]
+
+            for successor in successors:
+                if successor not in states:
+                    states[successor] = (frames, depth)
+                    worklist.append(successor)
+                elif states[successor] != (frames, depth):
+                    return False
+
+        if len(returns) > 1:
+            return False
+        if not returns:
+            return False if final else None
+        return lowest, returns.pop()
 
     @staticmethod
-    def _var_split(var: str) -> list:
-        # Splits variable into a list of frame and variable name
-        return var.split("@", 1)
+    def _freeze(values: any) -> any:
+        # Hashable key of frame or stack values, booleans and floats are tagged because True == 1 == 1.0
+        # and -0.0 == 0.0, string buffers are keyed by their contents
+        if values is None:
+            return None
+        key = []
+        for value in values:
+            kind = type(value)
+            if kind is bool:
+                value = (bool, value)
+            elif kind is float:
+                value = (float, value.hex())
+            elif kind is StringBuffer:
+                value = str(value)
+            key.append(value)
+        return tuple(key)
+
+
+class Superinstructions:
+    """
+    Superinstruction class
+    """
+    # Instructions which change the position, they can only end a fused sequence
+    CONTROL = {'JUMP', 'JUMPIFEQ', 'JUMPIFNEQ', 'JUMPIFEQS', 'JUMPIFNEQS', 'CALL', 'RETURN', 'EXIT'}
+    # Sequences fused when no profile is given
+    DEFAULT = {
+        ('LT', 'JUMPIFEQ'), ('LT', 'JUMPIFNEQ'), ('GT', 'JUMPIFEQ'), ('GT', 'JUMPIFNEQ'),
+        ('EQ', 'JUMPIFEQ'), ('EQ', 'JUMPIFNEQ'), ('ADD', 'JUMP'), ('SUB', 'JUMP'), ('MOVE', 'JUMP'),
+        ('PUSHS', 'PUSHS', 'ADDS', 'POPS'), ('PUSHS', 'PUSHS', 'SUBS', 'POPS'), ('PUSHS', 'PUSHS', 'MULS', 'POPS'),
+        ('PUSHS', 'PUSHS', 'JUMPIFEQS'), ('PUSHS', 'PUSHS', 'JUMPIFNEQS'),
+        ('CREATEFRAME', 'DEFVAR', 'MOVE', 'CALL'), ('PUSHFRAME', 'DEFVAR'), ('POPFRAME', 'RETURN'),
+    }
+    MAX_LENGTH = 4
+    # Number of the most executed sequences taken from a profile
+    PROFILE_SIZE = 32
+
+    def __init__(self, sequences: set = None) -> None:
+        # Initialize the pass with the set of opcode sequences to fuse
+        self.sequences = self.DEFAULT if sequences is None else sequences
+
+    @classmethod
+    def from_profile(cls, file_name: str) -> any:
+        # Create the pass with the most executed sequences of a profile written by record_profile
+        profile = cls._read_profile(file_name, missing_ok=False)
+        ranked = sorted(profile, key=lambda sequence: profile[sequence], reverse=True)
+        return cls({tuple(sequence.split()) for sequence in ranked[:cls.PROFILE_SIZE]})
+
+    @classmethod
+    def record_profile(cls, program: Program, counts: list, file_name: str) -> None:
+        # Add how many times every fusable sequence was executed to the profile in the file,
+        # so the profile can be accumulated over a whole corpus of programs
+        profile = cls._read_profile(file_name, missing_ok=True)
+        targets = cls._targets(program)
+        for position, count in enumerate(counts):
+            for length in range(2, cls.MAX_LENGTH + 1):
+                if count and cls._fusable(program, targets, position, length):
+                    sequence = ' '.join(opcode.upper() for opcode in program.opcodes[position:position + length])
+                    profile[sequence] = profile.get(sequence, 0) + count
+        import json
+        try:
+            with open(file_name, 'w') as file:
+                json.dump(profile, file, indent=1, sort_keys=True)
+        except OSError:
+            raise OutputFileError()
+
+    def fuse(self, function: Function, program: Program, code: list, counts: list = None) -> None:
+        # Replace the first instruction of every matching sequence by one handler executing the whole sequence,
+        # the remaining instructions stay in place and are skipped; if counts are given, the combined
+        # handler counts the executions of the original instructions for the statistics
+        targets = self._targets(program)
+        adaptive = getattr(function, 'SPECIALIZATIONS', {})
+        position = 0
+        while position < len(code):
+            for length in range(self.MAX_LENGTH, 1, -1):
+                sequence = tuple(opcode.upper() for opcode in program.opcodes[position:position + length])
+                if sequence in self.sequences and not adaptive.keys() & set(sequence) \
+                        and self._fusable(program, targets, position, length):
+                    parts = [(part, *code[part]) for part in range(position, position + length)]
+                    code[position] = (self._combine(function, parts, counts), ())
+                    position += length
+                    break
+            else:
+                position += 1
+
+    # Secondary functions
+    @staticmethod
+    def _combine(function: Function, parts: list, counts: list = None) -> any:
+        # Create the handler executing the parts, the position is updated before every part,
+        # so CALL, jumps and BREAK see their own position
+        (_, handler0, operands0), (position1, handler1, operands1) = parts[:2]
+        if counts is not None:
+            def combined() -> None:
+                handler0(*operands0)
+                for position, handler, operands in parts[1:]:
+                    counts[position] += 1
+                    function.position = position
+                    handler(*operands)
+        elif len(parts) == 2:
+            def combined() -> None:
+                handler0(*operands0)
+                function.position = position1
+                handler1(*operands1)
+        elif len(parts) == 3:
+            position2, handler2, operands2 = parts[2]
+
+            def combined() -> None:
+                handler0(*operands0)
+                function.position = position1
+                handler1(*operands1)
+                function.position = position2
+                handler2(*operands2)
+        else:
+            (position2, handler2, operands2), (position3, handler3, operands3) = parts[2:]
+
+            def combined() -> None:
+                handler0(*operands0)
+                function.position = position1
+                handler1(*operands1)
+                function.position = position2
+                handler2(*operands2)
+                function.position = position3
+                handler3(*operands3)
+        return combined
+
+    @classmethod
+    def _fusable(cls, program: Program, targets: set, position: int, length: int) -> bool:
+        # A sequence can be fused if no jump leads into its middle and only its last instruction changes the position
+        if position + length > len(program):
+            return False
+        for part in range(position, position + length - 1):
+            if program.opcodes[part].upper() in cls.CONTROL or part + 1 in targets:
+                return False
+        return True
+
+    @staticmethod
+    def _targets(program: Program) -> set:
+        # Positions where a jump or call continues
+        return {operands[0] + 1 for kinds, operands in zip(program.kinds, program.operands) if kinds[:1] == ('label',)}
+
+    @staticmethod
+    def _read_profile(file_name: str, missing_ok: bool) -> dict:
+        # Read a profile mapping space separated opcode sequences to their execution counts
+        import json
+        try:
+            with open(file_name) as file:
+                profile = json.load(file)
+        except FileNotFoundError:
+            if missing_ok:
+                return {}
+            raise InputFileError()
+        except (OSError, ValueError):
+            raise InputFileError()
+        if not isinstance(profile, dict):
+            raise InputFileError()
+        return profile
+
+
+class Profiler:
+    """
+    Execution profiler class
+    """
+    ROOT = 'main'
+
+    def __init__(self, program: Program) -> None:
+        # Initialize the profile of a compiled program: time of every position and of every stack of called labels,
+        # stacks are identified by numbers, stack 0 is the main program
+        self.program = program
+        self.times = [0.0] * len(program)
+        self.targets = {}
+        for label, target in program.labels.items():
+            self.targets.setdefault(target, label)
+        self.stacks = [(self.ROOT, None)]
+        self.stack_times = [0.0]
+        self.children = {}
+        self.calls = {}
+        self.chain = []
+
+    def enter(self, stack: int, target: int) -> int:
+        # Record a CALL of the label resolved to target from the given stack and return the stack of the callee
+        label = self.targets.get(target, str(target))
+        self.calls[label] = self.calls.get(label, 0) + 1
+        child = self.children.get((stack, label))
+        if child is None:
+            child = self.children[(stack, label)] = len(self.stacks)
+            self.stacks.append((label, stack))
+            self.stack_times.append(0.0)
+        self.chain.append(stack)
+        return child
+
+    def leave(self) -> int:
+        # Record a RETURN and return the stack of the caller
+        return self.chain.pop()
+
+    def write(self, file_name: str, counts: list) -> None:
+        # Write the time of every stack in the collapsed-stack format of flame graph tools (microseconds)
+        # to file_name and a report of the instructions and labels sorted by time to file_name.txt
+        try:
+            with open(file_name, 'w') as file:
+                for stack, elapsed in enumerate(self.stack_times):
+                    if elapsed > 0:
+                        file.write(f'{";".join(self._path(stack))} {round(elapsed * 1e6)}\n')
+            with open(file_name + '.txt', 'w') as file:
+                file.write(self.report(counts))
+        except OSError:
+            raise OutputFileError()
+
+    def report(self, counts: list) -> str:
+        # Return the text report of the profile
+        program = self.program
+        total = sum(self.times) or 1.0
+        lines = [f'Total time: {sum(self.times):.6f} s, executed instructions: {sum(counts)}', '',
+                 'Instructions by time:',
+                 f'{"order":>8} {"opcode":<12} {"count":>10} {"time [ms]":>11} {"per call [us]":>14} {"%":>6}']
+        for position in sorted(range(len(self.times)), key=lambda pos: (-self.times[pos], program.orders[pos])):
+            if not counts[position]:
+                continue
+            elapsed = self.times[position]
+            lines.append(f'{program.orders[position]:>8} {program.opcodes[position].upper():<12} '
+                         f'{counts[position]:>10} {elapsed * 1e3:>11.3f} {elapsed * 1e6 / counts[position]:>14.3f} '
+                         f'{elapsed * 100 / total:>6.2f}')
+
+        # Self time of a label is spent in its own instructions, total time includes the called labels,
+        # time of recursive calls is counted only once in the total
+        self_times, total_times = {}, {}
+        for stack, elapsed in enumerate(self.stack_times):
+            path = self._path(stack)
+            self_times[path[-1]] = self_times.get(path[-1], 0.0) + elapsed
+            for label in set(path):
+                total_times[label] = total_times.get(label, 0.0) + elapsed
+        lines += ['', 'Labels by total time:',
+                  f'{"label":<20} {"calls":>10} {"self [ms]":>11} {"total [ms]":>11} {"%":>6}']
+        for label in sorted(total_times, key=lambda name: (-total_times[name], name)):
+            lines.append(f'{label:<20} {self.calls.get(label, 0):>10} {self_times.get(label, 0.0) * 1e3:>11.3f} '
+                         f'{total_times[label] * 1e3:>11.3f} {total_times[label] * 100 / total:>6.2f}')
+        return '\n'.join(lines) + '\n'
+
+    # Secondary functions
+    def _path(self, stack: int) -> list:
+        # Labels of the stack from the main program to the innermost call
+        path = []
+        while stack is not None:
+            label, stack = self.stacks[stack]
+            path.append(label)
+        return path[::-1]
+
+
+class Sampler:
+    """
+    Sampling profiler class
+    """
+    def __init__(self, program: Program, function: Function, hz: int = 1000) -> None:
+        # Initialize the sampler of a function executing the compiled program, hz samples are taken
+        # per second of CPU time by a timer signal, or of wall time by a thread where the signal is not available
+        self.program = program
+        self.function = function
+        self.interval = 1 / hz
+        self.samples = {}
+        self.thread = None
+        self.stopped = None
+        self.owner = None
+        # Handler of SIGPROF before the sampler started, None if it was not installed from Python
+        self.previous = None
+        self.targets = {}
+        for label, target in program.labels.items():
+            self.targets.setdefault(target, label)
+
+    def start(self) -> None:
+        # Start taking samples
+        import signal
+        import threading
+        if hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread():
+            self.previous = signal.signal(signal.SIGPROF, self._sample)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+            return
+        self.stopped = threading.Event()
+        self.owner = threading.get_ident()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        # Stop taking samples
+        import signal
+        if self.thread is None:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            # A signal still pending is discarded by ignoring it, then the previous handler is restored
+            signal.signal(signal.SIGPROF, signal.SIG_IGN)
+            signal.signal(signal.SIGPROF, self.previous if self.previous is not None else signal.SIG_DFL)
+            return
+        self.stopped.set()
+        self.thread.join()
+
+    def write(self, file_name: str) -> None:
+        # Write the sample counts of every stack of called labels ending with the sampled instruction
+        # in the collapsed-stack format of flame graph tools to file_name and the hot-spot report to file_name.txt
+        stacks = {}
+        for (call_stack, position), count in self.samples.items():
+            stack = ';'.join(self._path(call_stack) + [self._instruction(position)])
+            stacks[stack] = stacks.get(stack, 0) + count
+        try:
+            with open(file_name, 'w') as file:
+                for stack in sorted(stacks):
+                    file.write(f'{stack} {stacks[stack]}\n')
+            with open(file_name + '.txt', 'w') as file:
+                file.write(self.report())
+        except OSError:
+            raise OutputFileError()
+
+    def report(self) -> str:
+        # Return the hot-spot report: sampled instructions and labels sorted by their number of samples
+        total = sum(self.samples.values()) or 1
+        lines = [f'Samples: {sum(self.samples.values())} (interval {self.interval * 1e3:g} ms)', '',
+                 'Instructions by samples:', f'{"order":>8} {"opcode":<12} {"samples":>10} {"%":>6}']
+        if isinstance(self.function, CompiledFunction):
+            # Python takes the samples only when a function is entered or a loop jumps back
+            lines[1:1] = ['Compiled blocks are sampled at their start and at the calls of instruction handlers,',
+                          'samples of the inlined instructions go to the next of these points']
+        positions = {}
+        for (_, position), count in self.samples.items():
+            positions[position] = positions.get(position, 0) + count
+        for position in sorted(positions, key=lambda pos: (-positions[pos], pos)):
+            opcode, order = self._instruction(position).split('@')
+            lines.append(f'{order:>8} {opcode:<12} {positions[position]:>10} {positions[position] * 100 / total:>6.2f}')
+
+        # Self samples were taken in the label's own instructions, total samples include the called labels
+        self_samples, total_samples = {}, {}
+        for (call_stack, _), count in self.samples.items():
+            path = self._path(call_stack)
+            self_samples[path[-1]] = self_samples.get(path[-1], 0) + count
+            for label in set(path):
+                total_samples[label] = total_samples.get(label, 0) + count
+        lines += ['', 'Labels by samples:', f'{"label":<20} {"self":>10} {"total":>10} {"%":>6}']
+        for label in sorted(total_samples, key=lambda name: (-total_samples[name], name)):
+            lines.append(f'{label:<20} {self_samples.get(label, 0):>10} {total_samples[label]:>10} '
+                         f'{total_samples[label] * 100 / total:>6.2f}')
+        return '\n'.join(lines) + '\n'
+
+    # Secondary functions
+    def _sample(self, signum: int = None, frame: any = None) -> None:
+        # Record the current position together with the positions of the active CALL instructions
+        function = self.function
+        key = (tuple(function.call_stack), function.current_position(frame))
+        self.samples[key] = self.samples.get(key, 0) + 1
+
+    def _run(self) -> None:
+        # Take samples in the background thread until the sampler is stopped,
+        # the frame of the thread executing the program is looked up for every sample
+        while not self.stopped.wait(self.interval):
+            self._sample(frame=sys._current_frames().get(self.owner))
+
+    def _path(self, call_stack: tuple) -> list:
+        # Labels called by the CALL instructions at the positions of call_stack
+        program = self.program
+        return [Profiler.ROOT] + [self.targets.get(program.operands[position][0], str(program.operands[position][0]))
+                                  for position in call_stack]
+
+    def _instruction(self, position: int) -> str:
+        # Opcode and order of the instruction at the position, the position is past the end after the last one
+        if not 0 <= position < len(self.program):
+            return 'END@0'
+        return f'{self.program.opcodes[position].upper()}@{self.program.orders[position]}'
 
 
 class Interpreter:
     """
     Interpreter class
     """
-    def __init__(self, stdin) -> None:
-        # Initializing the Interpreter class with input provided by stdin
-        self.function = Function(stdin)
+    # Function classes of the available execution engines
+    ENGINES = {'basic': Function, 'adaptive': AdaptiveFunction, 'compiled': CompiledFunction}
+
+    def __init__(self, stdin, stats: set = frozenset(), infer_types: bool = False, engine: str = 'basic',
+                 superinstructions: Superinstructions = None, fusion_profile: str = None,
+                 optimize: bool = False, stdout=None, profile: str = None, sample_profile: str = None,
+                 sample_hz: int = 1000, stderr=None, memoize: int = None) -> None:
+        # Initializing the Interpreter class with input provided by stdin and output written to stdout
+        # (DPRINT and BREAK write to stderr),
+        # stats is the set of requested statistics groups ('insts', 'hot', 'vars', 'frequent',
+        # 'memo-hits', 'memo-misses'), fusion_profile is the file where executed instruction sequences
+        # are recorded, profile is the file where the execution profile is written and sample_profile the file
+        # where the profile sampled sample_hz times per second is written, memoize is the cache size
+        # of the results of pure functions (no memoization if None)
+        self.function = self.ENGINES[engine](stdin, stdout, stderr)
+        self.stats = stats
+        self.infer_types = infer_types
+        self.superinstructions = superinstructions
+        self.fusion_profile = fusion_profile
+        self.optimize = optimize
+        self.profile = profile
+        self.profiler = None
+        self.sample_profile = sample_profile
+        self.sample_hz = sample_hz
+        self.memoize = memoize
+        self.memoizer = None
 
         # Variables for statistics
         self.insts = 0
-        self.hot_counter = {}
+        self.hot_counter = []
         self.hot = None
         self.vars = 0
         self.frequent = {}
 
-    def interpret(self, instructions: list) -> None:
-        # Parses the instructions, executes them, and updates statistics variables
-        instructions = self._parse_order(instructions)
-        self._parse_labels(instructions)
-        self._execute_instructions(instructions)
+    @classmethod
+    def compile(cls, instructions: list) -> Program:
+        # Sorts the instructions, resolves labels and validates all operands before execution
+        program = Program(cls._parse_order(instructions))
+        cls._parse_labels(program)
+        cls._check(program)
+        program.resolve_labels()
+        program.assign_slots()
+        return program
+
+    def interpret(self, program: Program) -> None:
+        # Executes the compiled program and updates statistics variables,
+        # they are updated also when the program ends by EXIT, which is raised as ProgramExit
+        if self.optimize:
+            program = Optimizer(program).run()
+        self.function.positions = program.positions
+        proven = TypeInference(program).run() if self.infer_types else set()
+        code = self.function.code = self._bind(program, proven)
+        if self.memoize is not None:
+            self.memoizer = Memoizer(program, self.memoize)
+            self.memoizer.run()
+            self.memoizer.bind(self.function, code)
+            if isinstance(self.function, CompiledFunction):
+                self.function.memoized = set(self.memoizer.reads)
+
+        # Instrumentation is only attached when some statistics or a profile were requested
+        instrumented = bool(self.stats - Memoizer.STATS) or self.fusion_profile is not None \
+            or self.profile is not None
+        if instrumented:
+            self.hot_counter = [0] * len(code)
+        if self.profile is not None:
+            self.profiler = Profiler(program)
+        compiled = isinstance(self.function, CompiledFunction) and self.profiler is None
+        if self.superinstructions is not None and not compiled:
+            self.superinstructions.fuse(self.function, program, code, self.hot_counter if instrumented else None)
+
+        # The output is flushed also when the program ends by EXIT or an error
+        sampler = None
+        if self.sample_profile is not None:
+            sampler = Sampler(program, self.function, self.sample_hz)
+            sampler.start()
+        try:
+            if self.profiler is not None:
+                self._execute_instructions_with_profile(code)
+            elif compiled:
+                self.function.execute(program, code, self.hot_counter if instrumented else None)
+            elif instrumented:
+                self._execute_instructions_with_stats(code)
+            else:
+                self._execute_instructions(code)
+        except ProgramExit:
+            self._finish(program)
+            raise
+        finally:
+            self.function.output.flush()
+            if self.profiler is not None:
+                self.profiler.write(self.profile, self.hot_counter)
+            if sampler is not None:
+                sampler.stop()
+                sampler.write(self.sample_profile)
+        self._finish(program)
+
+    def statistics(self) -> dict:
+        # Return the values of the requested statistics groups
+        values = {'insts': self.insts, 'hot': self.hot, 'vars': self.vars, 'frequent': self.frequent,
+                  'memo-hits': self.memoizer.hits if self.memoizer is not None else 0,
+                  'memo-misses': self.memoizer.misses if self.memoizer is not None else 0}
+        return {group: value for group, value in values.items() if group in self.stats}
+
+    # Secondary functions
+    def _finish(self, program: Program) -> None:
+        # Record the fusion profile and compute the statistics of the finished program
+        if self.fusion_profile is not None:
+            Superinstructions.record_profile(program, self.hot_counter, self.fusion_profile)
+        if not self.stats - Memoizer.STATS:
+            return
 
         # Methods for statistics
-        self._frequent(instructions)
-        self._sort_hot_counters()
-        self._update_hot(instructions)
+        self.frequent = program.opcode_counts
+        self._count_insts(program)
+        self._update_hot(program)
+        self.vars = self.function.max_vars
 
-    # Secondary functions
-    def _execute_instructions(self, instructions: list) -> None:
-        # Executes the instructions
+    def _execute_instructions(self, code: list) -> None:
+        # Executes the bound instructions, all checks were already done by _bind
+        func = self.function
+        size = len(code)
+        while func.position < size:
+            handler, operands = code[func.position]
+            handler(*operands)
+            func.position += 1
+
+    def _execute_instructions_with_stats(self, code: list) -> None:
+        # Executes the bound instructions and counts how many times each position was executed
+        func = self.function
+        size = len(code)
+        counts = self.hot_counter
+        while func.position < size:
+            counts[func.position] += 1
+            handler, operands = code[func.position]
+            handler(*operands)
+            func.position += 1
+
+    def _execute_instructions_with_profile(self, code: list) -> None:
+        # Executes the bound instructions, counts and times each position and attributes the time
+        # to the current stack of called labels, which changes whenever the call stack does
         func = self.function
-        while func.position < len(instructions):
-            self._inc_hot_counter(func.position)
-            self._count_vars(func)
-            instruction = instructions[func.position]
-            attr = f'instr_{instruction.opcode.lower()}'
-            args = self._get_args(instruction)
-            executor = self._get_executor(attr)
-            self._op_check(executor, args)
-            executor(*args)
-            self._inc_insts(instruction)
+        size = len(code)
+        counts = self.hot_counter
+        profiler = self.profiler
+        times = profiler.times
+        stack_times = profiler.stack_times
+        call_stack = func.call_stack
+        clock = time.perf_counter
+        depth = 0
+        stack = 0
+        start = clock()
+        while func.position < size:
+            position = func.position
+            counts[position] += 1
+            handler, operands = code[position]
+            handler(*operands)
+            now = clock()
+            times[position] += now - start
+            stack_times[stack] += now - start
+            start = now
+            if len(call_stack) != depth:
+                stack = profiler.enter(stack, func.position) if len(call_stack) > depth else profiler.leave()
+                depth = len(call_stack)
             func.position += 1
 
-    def _frequent(self, instrs: list) -> None:
-        # Count how many times each instruction appears in the instructions list
-        for instr in instrs:
-            if instr.opcode not in self.frequent:
-                self.frequent[instr.opcode] = 1
+    def _bind(self, program: Program, proven: set = frozenset()) -> list:
+        # Resolves every instruction of a checked program to its bound handler,
+        # instructions at proven positions get the handler without dynamic type checks
+        signatures = self.function.signatures()
+        code = []
+        for position, (opcode, operands) in enumerate(zip(program.opcodes, program.operands)):
+            if position in proven:
+                code.append((getattr(self.function, f'fast_{opcode.lower()}'), operands))
             else:
-                self.frequent[instr.opcode] += 1
-
-    def _inc_insts(self, instr: any) -> None:
-        # Increment insts counter if the instruction executed
-        if instr.opcode not in {'LABEL', 'DPRINT', 'BREAK'}:
-            self.insts += 1
-
-    def _count_vars(self, func: any) -> None:
-        # Get the maximum number of initialized variables present at any one time in all valid frames
-        res = 0
-        for frame in func.frames:
-            if func.frames[frame] is not None:
-                res += len(func.frames[frame])
-        if res > self.vars:
-            self.vars = res
-
-    def _inc_hot_counter(self, position: int) -> None:
-        # Increament hot counte
-        if position not in self.hot_counter:
-            self.hot_counter[position] = 0
-        self.hot_counter[position] += 1
-
-    def _get_executor(self, attr: str):
-        # Get executor method from Function class
-        try:
-            executor = getattr(self.function, attr)
-        except AttributeError:
-            exit(32)
-        return executor
-
-    def _sort_hot_counters(self) -> None:
-        # Sort hot counters in descending order by their values
-        self.hot_counter = dict(sorted(self.hot_counter.items(), key=lambda x: x[1], reverse=True))
-
-    def _update_hot(self, instructions: list) -> None:
-        # Update hot instruction order based on the most executed instruction
-        for key in self.hot_counter:
-            if instructions[key].opcode not in {'LABEL', 'DPRINT', 'BREAK'}:
-                self.hot = instructions[key].order
-                return
+                code.append((getattr(self.function, signatures[opcode.upper()][0]), operands))
+        return code
+
+    def _count_insts(self, program: Program) -> None:
+        # Sum the execution counts of all instructions except LABEL, DPRINT and BREAK
+        for position, count in enumerate(self.hot_counter):
+            if program.opcodes[position].upper() not in {'LABEL', 'DPRINT', 'BREAK'}:
+                self.insts += count
+
+    def _update_hot(self, program: Program) -> None:
+        # Update hot instruction order based on the most executed instruction,
+        # positions are sorted by order, so the first maximum has the smallest order
+        best = 0
+        for position, count in enumerate(self.hot_counter):
+            if count > best and program.opcodes[position].upper() not in {'LABEL', 'DPRINT', 'BREAK'}:
+                best = count
+                self.hot = program.orders[position]
 
-    def _parse_labels(self, instructions: list) -> None:
+    @staticmethod
+    def _parse_labels(program: Program) -> None:
         # Sets labels to the labels dictionary
-        for position, instruction in enumerate(instructions):
-            if instruction.opcode.upper() == 'LABEL':
-                if self._get_args(instruction)[0] in self.function.labels:
-                    exit(52)  # Error
-                self.function.labels[self._get_args(instruction)[0]] = position
+        for position, opcode in enumerate(program.opcodes):
+            if opcode.upper() == 'LABEL' and program.operands[position]:
+                label = program.operands[position][0]
+                if label in program.labels:
+                    raise SemanticError()
+                program.labels[label] = position
+
+    @classmethod
+    def _check(cls, program: Program) -> None:
+        # Checks that every opcode exists and its operands match the parameter kinds of its handler
+        signatures = Function.signatures()
+        for opcode, kinds, operands in zip(program.opcodes, program.kinds, program.operands):
+            if opcode.upper() not in signatures:
+                raise XMLStructureError()
+            cls._op_check(signatures[opcode.upper()][1], kinds, operands)
 
     @staticmethod
     def _parse_order(instructions: list) -> list:
@@ -792,44 +2744,26 @@ class Interpreter:
         orders = []
         for instruction in instructions:
             if instruction.order < 1:
-                exit(32)  # Error
+                raise XMLStructureError()
             orders.append(instruction.order)
         if len(set(orders)) != len(orders):
-            exit(32)  # Error
+            raise XMLStructureError()
 
         return sorted(instructions, key=lambda x: x.order)
 
     @staticmethod
-    def _get_args(instruction: Instruction) -> list:
-        # Get formatted arguments
-        result = []
-        for arg in instruction.args:
-            if arg.type_.lower() in {'var', 'label', 'type'}:
-                result.append(arg.text)
-            elif arg.type_.lower() in {'int', 'bool', 'string', 'float'}:
-                result.append(f'{arg.type_}@{arg.text}')
-            elif arg.type_.lower() == 'nil':
-                result.append('nil@nil')
-            else:
-                exit(56)  # Error
-        return result
-
-    @staticmethod
-    def _op_check(function: any, args: list) -> None:
-        # Check if the instruction arguments are valid
-        func_code = function.__code__
-        argcount = func_code.co_argcount
-        func_args = func_code.co_varnames[1:argcount]
-        if len(args) != argcount - 1:
-            exit(32)  # Error
-        for num, arg in enumerate(func_args):
-            if arg == 'var' and args[num].split('@')[0] not in {'GF', 'LF', 'TF'}:
-                exit(32)  # Error
-            elif 'symb' in arg and args[num].split('@')[0] not in {'GF', 'LF', 'TF', 'int',
-                                                                   'bool', 'string', 'nil', 'float'}:
-                exit(52)  # Error
-            elif arg == 'type_' and args[num] not in {'int', 'string', 'bool', 'label', 'nil', 'float'}:
-                exit(32)  # Error
+    def _op_check(params: tuple, kinds: tuple, operands: tuple) -> None:
+        # Check if the instruction arguments match the parameter kinds of its handler
+        if len(kinds) != len(params):
+            raise XMLStructureError()
+        for num, param in enumerate(params):
+            is_var = kinds[num] == 'var' and operands[num][0] in {'GF', 'LF', 'TF'}
+            if param == 'var' and not is_var:
+                raise XMLStructureError()
+            elif param == 'symb' and not is_var and kinds[num] not in {'int', 'bool', 'string', 'nil', 'float'}:
+                raise SemanticError()
+            elif param in {'label', 'type'} and kinds[num] != param:
+                raise XMLStructureError()
 
 
 class Statistic:
@@ -837,28 +2771,29 @@ class Statistic:
     Statistic class
     """
     def __init__(self) -> None:
-        # Initializes a Statistic class with the interpreter and print_arg attributes
-        self.interpreter = None
+        # Initializes a Statistic class with the statistics values and print_arg attributes
+        self.values = None
         self.print_arg = None
 
-    def stats(self, interpreter: Interpreter, args: list, file_name: str) -> None:
-        # Method to calculate and write statistics to a file based on given arguments
-        self.interpreter = interpreter
+    def stats(self, values: dict, args: list, file_name: str) -> None:
+        # Method to calculate and write statistics to a file based on given arguments,
+        # values are the statistics returned by Interpreter.statistics
+        self.values = values
 
         # Open file
         try:
             file = open(file_name, 'w')
         except OSError:
-            exit(12)  # Error
+            raise OutputFileError()
 
         # Parse arguments
         for arg in args:
             arg = arg.lstrip('--')
             if 'print=' in arg:
                 self.print_arg = arg.split('=')[1]
-                arg = re.sub('=.*', '', arg)
+                arg = arg.split('=')[0]
             try:
-                method = getattr(self, f'arg_{arg.lower()}')
+                method = getattr(self, f'arg_{arg.lower().replace("-", "_")}')
                 string = str(method())+'\n'
                 file.write(string)
             except (TypeError, AttributeError):
@@ -867,27 +2802,31 @@ class Statistic:
 
     def arg_insts(self):
         # Return insts
-        inter = self.interpreter
-        return inter.insts
+        return self.values['insts']
 
     def arg_hot(self):
         # Return hot
-        inter = self.interpreter
-        return inter.hot
+        return self.values['hot']
 
     def arg_vars(self):
         # Return vars
-        inter = self.interpreter
-        return inter.vars
+        return self.values['vars']
 
     def arg_frequent(self):
         # Return frequent
-        inter = self.interpreter
-        d = inter.frequent
+        d = self.values['frequent']
         max_value = max(d.values())
         keys = [k for k, v in d.items() if v == max_value]
         return ', '.join(keys)
 
+    def arg_memo_hits(self):
+        # Return memo-hits
+        return self.values['memo-hits']
+
+    def arg_memo_misses(self):
+        # Return memo-misses
+        return self.values['memo-misses']
+
     def arg_print(self):
         # Return print
         return self.print_arg
@@ -898,12 +2837,418 @@ class Statistic:
         return '\n'
 
 
+class Batch:
+    """
+    Batch runner class
+    """
+    # Compiled programs (or their compilation errors) of the worker process, keyed by the source file
+    programs = {}
+    MAX_PROGRAMS = 64
+
+    def __init__(self, patterns: list, workers: int = None, timeout: float = None, options: dict = None) -> None:
+        # Initialize the runner with manifests (*.json) or glob patterns of *.src files,
+        # every job runs in one of the worker processes with the Interpreter options
+        self.jobs = []
+        for pattern in patterns:
+            if pattern.endswith('.json'):
+                self.jobs.extend(self._read_manifest(pattern))
+            else:
+                self.jobs.extend(self._expand(pattern))
+        self.workers = workers
+        self.timeout = timeout
+        self.options = options or {}
+
+    def run(self, summary_file: str = None) -> int:
+        # Run all jobs, write the JSON summary to summary_file (standard output if None)
+        # and return 0 if all jobs passed or 1 otherwise
+        import json
+        import multiprocessing
+        start = time.perf_counter()
+        # Jobs of the same source are sent to a worker together, so they reuse its compiled program,
+        # a source with more jobs than a fair share of one worker is split to keep all workers busy
+        groups = {}
+        for num, job in enumerate(self.jobs):
+            groups.setdefault(job['source'], []).append((num, job, self.timeout, self.options))
+        size = max(1, -(-len(self.jobs) // (self.workers or os.cpu_count() or 1)))
+        chunks = [group[first:first + size] for group in groups.values() for first in range(0, len(group), size)]
+        with multiprocessing.Pool(self.workers) as pool:
+            results = sorted(result for chunk in pool.imap_unordered(self._run_chunk, chunks) for result in chunk)
+        jobs = [result for _, result in results]
+        passed = sum(job['passed'] for job in jobs)
+        summary = {'total': len(jobs), 'passed': passed, 'failed': len(jobs) - passed,
+                   'time': round(time.perf_counter() - start, 6), 'jobs': jobs}
+
+        try:
+            file = open(summary_file, 'w') if summary_file is not None else sys.stdout
+            json.dump(summary, file, indent=2)
+            file.write('\n')
+            if file is not sys.stdout:
+                file.close()
+        except OSError:
+            raise OutputFileError()
+        return 0 if passed == len(jobs) else 1
+
+    # Secondary functions
+    @classmethod
+    def _run_chunk(cls, chunk: list) -> list:
+        # Run the jobs of one chunk in the worker process
+        return [cls._run_job(task) for task in chunk]
+
+    @classmethod
+    def _run_job(cls, task: tuple) -> tuple:
+        # Run one job in the worker process and compare its output and return code with the expected ones,
+        # a compiled program is reused by all jobs of the same source executed by this worker
+        import signal
+        num, job, timeout, options = task
+        result = dict(job)
+        start = time.perf_counter()
+        if timeout and hasattr(signal, 'setitimer'):
+            signal.signal(signal.SIGALRM, cls._timeout)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        output = io.StringIO()
+        result['timeout'] = False
+        try:
+            # The alarm is cancelled before the handlers run, an alarm arriving just before is still a timeout
+            try:
+                result['reused'] = job['source'] in cls.programs
+                program = cls._load(job['source'])
+                if isinstance(program, InterpretError):
+                    raise program
+                stdin = open(job['input'], 'r') if job['input'] is not None else io.StringIO()
+                with stdin:
+                    code, _ = run(program, stdin, output, **options)
+            finally:
+                if timeout and hasattr(signal, 'setitimer'):
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+        except InterpretError as error:
+            code = error.code
+        except JobTimeout:
+            code = None
+            result['timeout'] = True
+        except Exception as error:
+            # Internal errors of the interpreter
+            code = 99
+            result['error'] = repr(error)
+        result['time'] = round(time.perf_counter() - start, 6)
+        result['rc'] = code
+
+        # The output is compared only if the program is expected to succeed
+        result['output_matches'] = None
+        if job['out'] is not None and job['expected_rc'] == 0 and code == 0:
+            try:
+                with open(job['out'], 'r', newline='') as file:
+                    result['output_matches'] = file.read() == output.getvalue()
+            except OSError:
+                result['output_matches'] = False
+        result['passed'] = code == job['expected_rc'] and result['output_matches'] is not False
+        return num, result
+
+    @classmethod
+    def _load(cls, source: str) -> any:
+        # Return the compiled program of the source, or the error of its compilation
+        if source not in cls.programs:
+            if len(cls.programs) >= cls.MAX_PROGRAMS:
+                cls.programs.clear()
+            try:
+                cls.programs[source] = load_program(source)
+            except InterpretError as error:
+                cls.programs[source] = error
+        return cls.programs[source]
+
+    @staticmethod
+    def _timeout(signum: int, frame: any) -> None:
+        # Interrupt a job which exceeded its time limit
+        raise JobTimeout()
+
+    @staticmethod
+    def _read_manifest(file_name: str) -> list:
+        # Read jobs from a JSON manifest, a list of objects with the source and optional input, out and rc keys,
+        # rc is the expected return code (0 by default), relative paths are relative to the manifest
+        import json
+        try:
+            with open(file_name, 'r') as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            raise InputFileError()
+        if not isinstance(entries, list):
+            raise InputFileError()
+
+        base = os.path.dirname(file_name)
+        jobs = []
+        for index, entry in enumerate(entries):
+            Batch._check_entry(file_name, index, entry)
+            paths = {key: os.path.join(base, entry[key]) if entry.get(key) is not None else None
+                     for key in ('source', 'input', 'out')}
+            jobs.append({'source': paths['source'], 'input': paths['input'], 'out': paths['out'],
+                         'expected_rc': entry.get('rc', 0)})
+        return jobs
+
+    @staticmethod
+    def _check_entry(file_name: str, index: int, entry: any) -> None:
+        # Check the types of the keys of a manifest entry, a bad entry is reported with its manifest and index
+        if not isinstance(entry, dict):
+            problem = 'is not an object'
+        elif not isinstance(entry.get('source'), str):
+            problem = 'has no source string'
+        elif not all(isinstance(entry.get(key), (str, type(None))) for key in ('input', 'out')):
+            problem = 'has an input or out that is not a string'
+        elif type(entry.get('rc', 0)) is not int:
+            problem = 'has an rc that is not an integer'
+        else:
+            return
+        raise InputFileError(f'{file_name}: entry {index} {problem}')
+
+    @staticmethod
+    def _expand(pattern: str) -> list:
+        # Create jobs from *.src files matching the glob pattern, name.in is the input, name.out the expected
+        # output and name.rc the expected return code of name.src, missing files mean empty input and code 0
+        import glob
+        jobs = []
+        for source in sorted(glob.glob(pattern, recursive=True)):
+            if not source.endswith('.src'):
+                continue
+            stem = source[:-4]
+            expected_rc = 0
+            if os.path.exists(stem + '.rc'):
+                try:
+                    with open(stem + '.rc', 'r') as file:
+                        expected_rc = int(file.read().strip())
+                except (OSError, ValueError):
+                    raise InputFileError()
+            jobs.append({'source': source,
+                         'input': stem + '.in' if os.path.exists(stem + '.in') else None,
+                         'out': stem + '.out' if os.path.exists(stem + '.out') else None,
+                         'expected_rc': expected_rc})
+        return jobs
+
+
+class Channel:
+    """
+    Server response stream class
+    """
+    def __init__(self, connection: any, key: str) -> None:
+        # Initialize the stream, everything written is sent over the connection as a {key: text} message
+        self.connection = connection
+        self.key = key
+
+    def write(self, text: str) -> int:
+        # Send the text as one JSON line
+        import json
+        if text:
+            self.connection.sendall(json.dumps({self.key: text}).encode() + b'\n')
+        return len(text)
+
+    def flush(self) -> None:
+        # Messages are sent as soon as they are written
+        pass
+
+
+class Server:
+    """
+    Interpreter server class
+    """
+    # Compiled programs (or their compilation errors) of the server process, keyed by the source
+    programs = {}
+    MAX_PROGRAMS = 64
+    GROUPS = ('insts', 'hot', 'vars', 'frequent', 'memo-hits', 'memo-misses')
+
+    def __init__(self, address: str, workers: int = None, timeout: float = None, options: dict = None) -> None:
+        # Initialize the server listening on the Unix socket address, with workers the jobs are run
+        # concurrently by that many forked processes, every job runs with the Interpreter options
+        self.address = address
+        self.workers = workers
+        self.timeout = timeout
+        self.options = options or {}
+
+    def run(self) -> int:
+        # Serve jobs until the server is interrupted (SIGINT or SIGTERM), return 0
+        import signal
+        import socket
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            listener.bind(self.address)
+            listener.listen(64)
+        except OSError:
+            listener.close()
+            raise OutputFileError()
+
+        signal.signal(signal.SIGTERM, self._terminate)
+        children = set()
+        try:
+            if not self.workers:
+                self._serve(listener)
+            children = {self._fork(listener) for _ in range(self.workers)}
+            while True:
+                # A worker which died is replaced by a new one
+                pid, _ = os.wait()
+                children.discard(pid)
+                children.add(self._fork(listener))
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            for pid in children:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                    os.waitpid(pid, 0)
+                except OSError:
+                    pass
+            listener.close()
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+        return 0
+
+    @staticmethod
+    def submit(address: str, job: dict, stdout=None, stderr=None) -> tuple:
+        # Client side: send the job to the server, copy the streamed output to the stdout and stderr
+        # streams (standard streams if None) and return the exit code and the statistics of the job
+        import json
+        import socket
+        stdout = stdout if stdout is not None else sys.stdout
+        stderr = stderr if stderr is not None else sys.stderr
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(address)
+            connection.sendall(json.dumps(job).encode() + b'\n')
+            with connection.makefile('rb') as file:
+                for line in file:
+                    message = json.loads(line)
+                    if 'stdout' in message:
+                        stdout.write(message['stdout'])
+                    elif 'stderr' in message:
+                        stderr.write(message['stderr'])
+                    else:
+                        return message['rc'], message.get('stats', {})
+        raise ConnectionError('incomplete response')
+
+    # Secondary functions
+    def _fork(self, listener: any) -> int:
+        # Start a worker process serving jobs from the listener and return its pid
+        pid = os.fork()
+        if pid == 0:
+            # The worker never returns to the caller
+            try:
+                self._serve(listener)
+            except (KeyboardInterrupt, SystemExit):
+                pass
+            finally:
+                os._exit(0)
+        return pid
+
+    def _serve(self, listener: any) -> None:
+        # Accept connections one by one, each one carries a single job
+        while True:
+            connection, _ = listener.accept()
+            with connection:
+                try:
+                    self._handle(connection)
+                except OSError:
+                    # The client went away, the next job is not affected
+                    pass
+
+    def _handle(self, connection: any) -> None:
+        # Read one JSON job line, run it in a fresh Interpreter and stream back its output, then send the final
+        # {"rc": code, "stats": {...}, "time": seconds} message, a job is an object with either the source
+        # file name or the inline xml of the program, the optional input text (or input file name)
+        # and the optional list of statistics groups (insts, hot, vars, frequent, memo-hits, memo-misses)
+        import json
+        import signal
+        start = time.perf_counter()
+        response = {}
+        if self.timeout and hasattr(signal, 'setitimer'):
+            signal.signal(signal.SIGALRM, Batch._timeout)
+            signal.setitimer(signal.ITIMER_REAL, self.timeout)
+        try:
+            # The alarm is cancelled before the handlers run, like in Batch._run_job
+            try:
+                with connection.makefile('rb') as file:
+                    line = file.readline()
+                try:
+                    job = json.loads(line)
+                except ValueError:
+                    raise ParameterError()
+                if not isinstance(job, dict):
+                    raise ParameterError()
+                stats = job.get('stats', [])
+                if not isinstance(stats, list) or not set(stats) <= set(self.GROUPS):
+                    raise ParameterError()
+
+                program = self._load(job)
+                if isinstance(program, InterpretError):
+                    raise program
+                if job.get('input_file') is not None:
+                    stdin = get_stdin(job['input_file'])
+                else:
+                    stdin = io.StringIO(job.get('input') or '')
+                with stdin:
+                    code, values = run(program, stdin, Channel(connection, 'stdout'), set(stats),
+                                       stderr=Channel(connection, 'stderr'), **self.options)
+                response['stats'] = values
+            finally:
+                if self.timeout and hasattr(signal, 'setitimer'):
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+        except InterpretError as error:
+            code = error.code
+        except JobTimeout:
+            code = None
+            response['timeout'] = True
+        except Exception as error:
+            # Internal errors of the interpreter
+            code = 99
+            response['error'] = repr(error)
+        response['rc'] = code
+        response['time'] = round(time.perf_counter() - start, 6)
+        connection.sendall(json.dumps(response).encode() + b'\n')
+
+    @classmethod
+    def _load(cls, job: dict) -> any:
+        # Return the compiled program of the job, or the error of its compilation, a source file is recompiled
+        # when it changes and inline XML is keyed by its hash
+        import hashlib
+        if job.get('xml') is not None:
+            text = job['xml'].encode()
+            key = ('xml', hashlib.sha256(text).hexdigest())
+            source = io.BytesIO(text)
+        elif job.get('source') is not None:
+            try:
+                status = os.stat(job['source'])
+            except OSError:
+                return InputFileError()
+            key = ('source', os.path.abspath(job['source']), status.st_mtime_ns, status.st_size)
+            source = job['source']
+        else:
+            return ParameterError()
+
+        if key not in cls.programs:
+            if len(cls.programs) >= cls.MAX_PROGRAMS:
+                cls.programs.clear()
+            try:
+                cls.programs[key] = load_program(source)
+            except InterpretError as error:
+                cls.programs[key] = error
+        return cls.programs[key]
+
+    @staticmethod
+    def _terminate(signum: int, frame: any) -> None:
+        # Stop serving on SIGTERM
+        sys.exit(0)
+
+
 def parse_args() -> dict:
     # This function defines a parser for command line arguments
     # and returns the parsed arguments
-    # [--source=SOURCE] [--input=INPUT] [--stats=STATS] [--insts] [--hot] [--vars] [--frequent] [--print=PRINT] [--eol]
+    # [--source=SOURCE] [--input=INPUT] [--cache-dir=DIR] [--infer-types] [--engine=ENGINE]
+    # [--superinstructions[=PROFILE]] [--fusion-profile=PROFILE] [--optimize] [--memoize[=SIZE]]
+    # [--batch=PATTERN]... [--jobs=N] [--timeout=SECONDS] [--summary=FILE] [--profile=FILE]
+    # [--sample-profile=FILE] [--sample-hz=N] [--serve=SOCKET]
+    # [--stats=STATS] [--insts] [--hot] [--vars] [--frequent] [--memo-hits] [--memo-misses] [--print=PRINT] [--eol]
     help_msg = """
-    usage: interpret.py [-h] [--source=FILE] [--input=FILE] [--stats=FILE] [--insts] [--hot] [--vars] [--frequent] [--print=STRING] [--eol]
+    usage: interpret.py [-h] [--source=FILE] [--input=FILE] [--cache-dir=DIR] [--infer-types] [--engine=ENGINE]
+                        [--superinstructions[=FILE]] [--fusion-profile=FILE] [--optimize] [--memoize[=SIZE]]
+                        [--batch=PATTERN]... [--jobs=N] [--timeout=SECONDS] [--summary=FILE] [--profile=FILE]
+                        [--sample-profile=FILE] [--sample-hz=N] [--serve=SOCKET]
+                        [--stats=FILE] [--insts] [--hot] [--vars] [--frequent] [--memo-hits] [--memo-misses]
+                        [--print=STRING] [--eol]
 
     The script loads an XML representation of a program interprets the program using input according to
     command line parameters and generates output.
@@ -912,40 +3257,186 @@ def parse_args() -> dict:
       -h, --help       show this help message and exit
       --source=FILE    An source file with an XML representation of the source code
       --input=FILE     Input file for using as standard input
+      --cache-dir=DIR  Directory for caching compiled programs keyed by a hash of the source bytes,
+                       so it also works for sources read from a stream
+      --infer-types    Skip dynamic type checks of instructions whose operand types are statically proven
+      --engine=ENGINE  Execution engine: basic (default), adaptive, which specializes arithmetic,
+                       relational and logical instructions for the operand types they are executed with,
+                       or compiled, which compiles basic blocks of the program to Python functions
+      --superinstructions[=FILE]
+                       Execute common instruction sequences as single instructions, the sequences are
+                       the most executed ones from the profile FILE or a built-in set
+      --fusion-profile=FILE
+                       Add the execution counts of instruction sequences to the profile FILE
+      --optimize       Fold constant expressions, propagate constants and remove unreachable instructions
+      --memoize[=SIZE] Cache the results of functions which only use their temporary and local frames and
+                       the data stack, keyed by the temporary frame and the stack values they read, the least
+                       recently used of SIZE results (65536 by default) is dropped first, instructions of calls
+                       answered from the cache are not executed and not counted by --insts and --hot, and the
+                       frames they would create are not counted by --vars
+      --batch=PATTERN  Run a batch of tests instead of a single program, PATTERN is a JSON manifest or a glob
+                       pattern of .src files with the .in, .out and .rc files next to them, can be repeated
+      --jobs=N         Number of worker processes of the batch (the number of CPUs by default)
+                       or of the server (jobs are run by the server process itself by default)
+      --timeout=SECONDS
+                       Time limit of one batch or server job
+      --summary=FILE   File for the JSON summary of the batch (standard output by default),
+                       the return code is 0 if all jobs passed and 1 otherwise
+      --profile=FILE   Write the time spent in every stack of called labels to FILE in the collapsed-stack
+                       format of flame graph tools and a report of instructions and labels to FILE.txt
+      --sample-profile=FILE
+                       Sample the executed instruction and the called labels periodically, the samples are
+                       written to FILE in the collapsed-stack format and a hot-spot report to FILE.txt,
+                       with --engine=compiled the samples of inlined instructions go to the next handler call
+                       or block start, because Python cannot be interrupted in between
+      --sample-hz=N    Number of samples per second of CPU time (1000 by default)
+      --serve=SOCKET   Keep running and serve jobs sent to the Unix socket SOCKET, a job is a JSON line
+                       {"source": FILE or "xml": XML, "input": TEXT or "input_file": FILE, "stats": [GROUP...]},
+                       the output is streamed back as {"stdout": TEXT} and {"stderr": TEXT} lines followed by
+                       {"rc": CODE, "stats": {GROUP: VALUE...}, "time": SECONDS}
       --stats=FILE     Get the code interpretation statistics
       --insts          Listing the number of executed instructions
       --hot            Returns value of the order instruction attribute that was executed the most times and
                        has the smallest value of the order attribute
       --vars           List the maximum number of initialized variables present at one time in all valid frames
       --frequent       Returns the names of the most common operation codes
+      --memo-hits      Number of calls answered from the --memoize cache
+      --memo-misses    Number of calls of memoized functions which were executed
       --print=STRING   Prints the string string to the statistics
       --eol            Prints the end of line
     """
 
     stats_lists = []
     temp_list = []
-    pattern = lambda p: fr"^--{p}=(.*)$"
+
+    def option(param: str, name: str) -> any:
+        # Returns the value of a --name=value parameter, or None for other parameters
+        prefix = f'--{name}='
+        return param[len(prefix):] if param.startswith(prefix) else None
 
     src = None
     inp = None
+    cache_dir = None
+    infer_types = '--infer-types' in sys.argv
+    engine = 'basic'
+    superinstructions = Superinstructions() if '--superinstructions' in sys.argv else None
+    memoize = Memoizer.SIZE if '--memoize' in sys.argv else None
+    stats_params = ['--insts', '--hot', '--vars', '--frequent', '--memo-hits', '--memo-misses', '--eol']
+    fusion_profile = None
+    optimize = '--optimize' in sys.argv
+    batch = []
+    jobs = None
+    timeout = None
+    summary = None
+    profile = None
+    sample_profile = None
+    sample_hz = 1000
+    serve = None
 
     # Help argument
     if '-h' in sys.argv or '--help' in sys.argv:
         print(help_msg)
-        exit(0)
+        sys.exit(0)
 
     for param in sys.argv:
-        src_match = re.search(pattern('source'), param)
+        src_match = option(param, 'source')
         if src_match is not None:
-            src = src_match.group(1).strip()
+            src = src_match.strip()
             continue
 
-        inp_match = re.search(pattern('input'), param)
+        inp_match = option(param, 'input')
         if inp_match is not None:
-            inp = inp_match.group(1).strip()
+            inp = inp_match.strip()
+            continue
+
+        cache_match = option(param, 'cache-dir')
+        if cache_match is not None:
+            cache_dir = cache_match.strip()
+            continue
+
+        engine_match = option(param, 'engine')
+        if engine_match is not None:
+            engine = engine_match.strip()
+            if engine not in Interpreter.ENGINES:
+                raise ParameterError()
+            continue
+
+        super_match = option(param, 'superinstructions')
+        if super_match is not None:
+            superinstructions = Superinstructions.from_profile(super_match.strip())
             continue
 
-        st_match = re.search(pattern('stats'), param)
+        memo_match = option(param, 'memoize')
+        if memo_match is not None:
+            try:
+                memoize = int(memo_match)
+            except ValueError:
+                raise ParameterError()
+            if memoize < 1:
+                raise ParameterError()
+            continue
+
+        profile_match = option(param, 'fusion-profile')
+        if profile_match is not None:
+            fusion_profile = profile_match.strip()
+            continue
+
+        batch_match = option(param, 'batch')
+        if batch_match is not None:
+            batch.append(batch_match.strip())
+            continue
+
+        jobs_match = option(param, 'jobs')
+        if jobs_match is not None:
+            try:
+                jobs = int(jobs_match)
+            except ValueError:
+                raise ParameterError()
+            if jobs < 1:
+                raise ParameterError()
+            continue
+
+        timeout_match = option(param, 'timeout')
+        if timeout_match is not None:
+            try:
+                timeout = float(timeout_match)
+            except ValueError:
+                raise ParameterError()
+            if timeout <= 0:
+                raise ParameterError()
+            continue
+
+        summary_match = option(param, 'summary')
+        if summary_match is not None:
+            summary = summary_match.strip()
+            continue
+
+        sample_match = option(param, 'sample-profile')
+        if sample_match is not None:
+            sample_profile = sample_match.strip()
+            continue
+
+        hz_match = option(param, 'sample-hz')
+        if hz_match is not None:
+            try:
+                sample_hz = int(hz_match)
+            except ValueError:
+                raise ParameterError()
+            if sample_hz < 1:
+                raise ParameterError()
+            continue
+
+        serve_match = option(param, 'serve')
+        if serve_match is not None:
+            serve = serve_match.strip()
+            continue
+
+        prof_match = option(param, 'profile')
+        if prof_match is not None:
+            profile = prof_match.strip()
+            continue
+
+        st_match = option(param, 'stats')
         if st_match is not None:
             if temp_list:
                 stats_lists.append(temp_list)
@@ -953,46 +3444,100 @@ def parse_args() -> dict:
             temp_list.append(param)
             continue
 
-        pr_match = re.search(pattern('print'), param)
-        if not temp_list and (param in ['--insts', '--hot', '--vars', '--frequent', '--eol'] or pr_match is not None):
-            exit(10)
-        elif param in ['--insts', '--hot', '--vars', '--frequent', '--eol'] or pr_match is not None:
+        pr_match = option(param, 'print')
+        if not temp_list and (param in stats_params or pr_match is not None):
+            raise ParameterError()
+        elif param in stats_params or pr_match is not None:
             temp_list.append(param)
     if temp_list:
         stats_lists.append(temp_list)
 
-    return {'source': src, 'input': inp, 'stats_lists': stats_lists}
+    # Statistics groups computed by the Interpreter
+    stats_groups = {param[2:] for stats in stats_lists for param in stats[1:]} \
+        & ({'insts', 'hot', 'vars', 'frequent'} | Memoizer.STATS)
 
+    return {'source': src, 'input': inp, 'cache_dir': cache_dir, 'infer_types': infer_types, 'engine': engine,
+            'superinstructions': superinstructions, 'fusion_profile': fusion_profile, 'optimize': optimize,
+            'batch': batch, 'jobs': jobs, 'timeout': timeout, 'summary': summary, 'profile': profile,
+            'sample_profile': sample_profile, 'sample_hz': sample_hz, 'serve': serve, 'memoize': memoize,
+            'stats_lists': stats_lists, 'stats_groups': stats_groups}
 
-def get_stdin(input_file: str) -> str:
-    # Get standard input from a file specified by the input_file
+
+def get_stdin(input_file: str) -> any:
+    # Open the file specified by the input_file, READ consumes it line by line
     try:
-        file = open(input_file, 'r')
+        return open(input_file, 'r', buffering=1 << 16)
     except FileNotFoundError:
-        exit(11)  # Error
-
-    stdin = file.read()
-    file.close()
-
-    return stdin
+        raise InputFileError()
+
+
+def load_program(source: any, cache_dir: str = None) -> Program:
+    # Load and compile the source program (a file name or a stream), reusing its compiled form from cache_dir
+    # when possible, a stream is read into memory first because it is both hashed and parsed
+    if cache_dir is None:
+        return Interpreter.compile(Instruction.get_instructions_from_xml(source))
+
+    if not isinstance(source, (str, os.PathLike)):
+        data = source.read()
+        source = io.BytesIO(data.encode() if isinstance(data, str) else data)
+    cache = ProgramCache(cache_dir)
+    key = cache.key(source)
+    program = cache.get(key)
+    if program is None:
+        program = Interpreter.compile(Instruction.get_instructions_from_xml(source))
+        cache.put(key, program)
+    return program
+
+
+def run(program: any, stdin=None, stdout=None, stats: set = frozenset(), cache_dir: str = None,
+        stderr=None, **options: any) -> tuple:
+    # Library entry point: run a program (a compiled Program, or a source file name or stream to load)
+    # with the given input, output and error streams, standard streams are used if they are None,
+    # options are the keyword arguments of Interpreter (infer_types, engine, superinstructions, ...).
+    # Returns the exit code and the requested statistics, errors are raised as InterpretError subclasses
+    if not isinstance(program, Program):
+        program = load_program(program, cache_dir)
+    inter = Interpreter(stdin, stats, stdout=stdout, stderr=stderr, **options)
+    try:
+        inter.interpret(program)
+    except ProgramExit as program_exit:
+        return program_exit.code, inter.statistics()
+    return 0, inter.statistics()
 
 
 def main() -> None:
-    # Entry point of the program
-    args = parse_args()
-
-    source = args['source']
-    if source is not None:
-        input_file = args['input']
-        stdin = get_stdin(input_file) if input_file is not None else None
-
-        instructions = Instruction.get_instructions_from_xml(source)
-        inter = Interpreter(stdin)
-        inter.interpret(instructions)
-
-        for stats in args['stats_lists']:
-            stats_file = stats[0].split('=')[1]
-            Statistic().stats(inter, stats[1:], stats_file)
+    # Entry point of the program, errors are reported by the return code
+    try:
+        args = parse_args()
+
+        options = {'infer_types': args['infer_types'], 'engine': args['engine'],
+                   'superinstructions': args['superinstructions'], 'optimize': args['optimize'],
+                   'memoize': args['memoize']}
+        if args['batch']:
+            sys.exit(Batch(args['batch'], args['jobs'], args['timeout'], options).run(args['summary']))
+        if args['serve'] is not None:
+            sys.exit(Server(args['serve'], args['jobs'], args['timeout'], options).run())
+
+        source = args['source']
+        if source is not None:
+            input_file = args['input']
+            stdin = get_stdin(input_file) if input_file is not None else None
+
+            code, values = run(source, stdin, stats=args['stats_groups'], cache_dir=args['cache_dir'],
+                               infer_types=args['infer_types'], engine=args['engine'],
+                               superinstructions=args['superinstructions'], fusion_profile=args['fusion_profile'],
+                               optimize=args['optimize'], profile=args['profile'],
+                               sample_profile=args['sample_profile'], sample_hz=args['sample_hz'],
+                               memoize=args['memoize'])
+
+            for stats in args['stats_lists']:
+                stats_file = stats[0].split('=')[1]
+                Statistic().stats(values, stats[1:], stats_file)
+            sys.exit(code)
+    except InterpretError as error:
+        if error.args:
+            sys.stderr.write(f'{error}\n')
+        sys.exit(error.code)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,792 @@
+#
+# Regression tests of the interpreter
+#
+import io
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import interpret  # noqa: E402
+
+
+def program(*instructions: str) -> io.BytesIO:
+    # Build the XML source of a program from the XML of its instructions
+    body = ''.join(f'<instruction order="{order}" {text}</instruction>' for order, text in enumerate(instructions, 1))
+    return io.BytesIO(f'<?xml version="1.0" encoding="UTF-8"?><program language="IPPcode23">{body}</program>'.encode())
+
+
+def instruction(opcode: str, *args: str) -> str:
+    # XML of an instruction for program(), every argument is given as TYPE:TEXT
+    parts = [arg.partition(':') for arg in args]
+    return f'opcode="{opcode}">' + ''.join(f'<arg{num} type="{kind}">{text}</arg{num}>'
+                                           for num, (kind, _, text) in enumerate(parts, 1))
+
+
+def write(arg_type: str, text: str) -> io.BytesIO:
+    # Program writing one constant argument
+    return program(f'opcode="WRITE"><arg1 type="{arg_type}">{text}</arg1>')
+
+
+class ArgumentTypeTest(unittest.TestCase):
+    """
+    Argument type test class
+    """
+    def run_program(self, source: io.BytesIO) -> tuple:
+        # Run the program and return its exit code and output
+        output = io.StringIO()
+        code, _ = interpret.run(source, io.StringIO(), output)
+        return code, output.getvalue()
+
+    def test_uppercase_type(self):
+        # Constant types have to be lowercase
+        for arg_type, text in (('INT', 'abc'), ('INT', '5'), ('FLOAT', '0x1p+1'), ('Bool', 'true')):
+            with self.subTest(arg_type=arg_type, text=text):
+                with self.assertRaises(interpret.SemanticError):
+                    self.run_program(write(arg_type, text))
+
+    def test_caseless_type(self):
+        # Variable, label, type and nil arguments are accepted in any case
+        self.assertEqual(self.run_program(write('NIL', 'nil')), (0, ''))
+
+    def test_malformed_literal(self):
+        # Malformed int and float literals are rejected as an invalid structure
+        for arg_type, text in (('int', 'abc'), ('float', 'zz'), ('float', '0x1p+')):
+            with self.subTest(arg_type=arg_type, text=text):
+                with self.assertRaises(interpret.XMLStructureError):
+                    self.run_program(write(arg_type, text))
+
+    def test_literal(self):
+        # Well-formed literals are written as before
+        self.assertEqual(self.run_program(write('int', '-12')), (0, '-12'))
+        self.assertEqual(self.run_program(write('float', '0x1p+1')), (0, '0x1.0000000000000p+1'))
+
+
+class FrameSlotTest(unittest.TestCase):
+    """
+    Frame slot numbering test class
+    """
+    def slots(self, *instructions: str) -> list:
+        # Compile the program and return the variable operands of its instructions
+        compiled = interpret.load_program(program(*instructions))
+        return [operands for operands in compiled.operands if operands]
+
+    def test_frames_numbered_per_site(self):
+        # Frames created by different CREATEFRAME instructions have their own dense slots
+        self.assertEqual(self.slots(
+            'opcode="CREATEFRAME">', 'opcode="DEFVAR"><arg1 type="var">TF@a</arg1>',
+            'opcode="CREATEFRAME">', 'opcode="DEFVAR"><arg1 type="var">TF@b</arg1>',
+        ), [((interpret.TF, 1),), ((interpret.TF, 1),)])
+
+    def test_function_frames(self):
+        # A local frame of a function shares the slots of the temporary frames of all its calls
+        self.assertEqual(self.slots(
+            'opcode="CREATEFRAME">', 'opcode="DEFVAR"><arg1 type="var">TF@x</arg1>', 'opcode="PUSHFRAME">',
+            'opcode="CALL"><arg1 type="label">f</arg1>', 'opcode="POPFRAME">',
+            'opcode="CREATEFRAME">', 'opcode="DEFVAR"><arg1 type="var">TF@y</arg1>', 'opcode="PUSHFRAME">',
+            'opcode="CALL"><arg1 type="label">f</arg1>', 'opcode="POPFRAME">',
+            'opcode="CREATEFRAME">', 'opcode="DEFVAR"><arg1 type="var">TF@z</arg1>',
+            'opcode="EXIT"><arg1 type="int">0</arg1>',
+            'opcode="LABEL"><arg1 type="label">f</arg1>', 'opcode="WRITE"><arg1 type="var">LF@y</arg1>',
+            'opcode="RETURN">',
+        ), [((interpret.TF, 1),), (12,), ((interpret.TF, 2),), (12,), ((interpret.TF, 1),), (0,),
+            ((interpret.LF, 2),)])
+
+    def test_unknown_frame_stack(self):
+        # Frames share one numbering if the frame stack depth depends on the path
+        self.assertEqual(self.slots(
+            'opcode="LABEL"><arg1 type="label">loop</arg1>', 'opcode="CREATEFRAME">',
+            'opcode="DEFVAR"><arg1 type="var">TF@a</arg1>', 'opcode="PUSHFRAME">',
+            'opcode="CREATEFRAME">', 'opcode="DEFVAR"><arg1 type="var">TF@b</arg1>',
+            'opcode="JUMP"><arg1 type="label">loop</arg1>',
+        ), [((interpret.TF, 1),), ((interpret.TF, 2),), (-1,)])
+
+    def test_defined_count(self):
+        # Variables of discarded temporary frames are no longer counted
+        source = (
+            'opcode="DEFVAR"><arg1 type="var">GF@g</arg1>',
+            'opcode="CREATEFRAME">', 'opcode="DEFVAR"><arg1 type="var">TF@a</arg1>',
+            'opcode="DEFVAR"><arg1 type="var">TF@b</arg1>',
+            'opcode="CREATEFRAME">', 'opcode="DEFVAR"><arg1 type="var">TF@c</arg1>',
+            'opcode="PUSHFRAME">', 'opcode="POPFRAME">', 'opcode="CREATEFRAME">',
+            'opcode="DEFVAR"><arg1 type="var">GF@h</arg1>', 'opcode="DEFVAR"><arg1 type="var">GF@i</arg1>',
+        )
+        for engine in ('basic', 'compiled'):
+            with self.subTest(engine=engine):
+                self.assertEqual(interpret.run(program(*source), io.StringIO(), io.StringIO(), {'vars'}, engine=engine),
+                                 (0, {'vars': 3}))
+
+
+class BatchManifestTest(unittest.TestCase):
+    """
+    Batch manifest test class
+    """
+    def read(self, entries: list) -> list:
+        # Write the entries into a manifest and read its jobs
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, 'manifest.json')
+            with open(file_name, 'w') as file:
+                json.dump(entries, file)
+            return interpret.Batch._read_manifest(file_name)
+
+    def test_bad_entry(self):
+        # Malformed entries are input file errors naming the manifest and the index of the entry
+        for entry in ('a.src', {}, {'source': 1}, {'source': 'a.src', 'input': ['a.in']}, {'source': 'a.src', 'out': 2},
+                      {'source': 'a.src', 'rc': '52'}, {'source': 'a.src', 'rc': True}):
+            with self.subTest(entry=entry):
+                with self.assertRaisesRegex(interpret.InputFileError, r'manifest\.json: entry 1 '):
+                    self.read([{'source': 'b.src'}, entry])
+
+    def test_run(self):
+        # Jobs pass if their return code and output match, an endless program is stopped by the timeout
+        loop = program(instruction('LABEL', 'label:loop'), instruction('JUMP', 'label:loop')).read().decode()
+        files = {'ok.src': write('string', 'ok').read().decode(), 'ok.out': 'ok',
+                 'bad.src': write('string', 'bad').read().decode(), 'bad.out': 'good',
+                 'fail.src': write('var', 'GF@x').read().decode(), 'fail.rc': '54',
+                 'loop.src': loop, 'loop.rc': '0'}
+        with tempfile.TemporaryDirectory() as directory:
+            for name, text in files.items():
+                with open(os.path.join(directory, name), 'w') as file:
+                    file.write(text)
+            with open(os.path.join(directory, 'manifest.json'), 'w') as file:
+                json.dump([{'source': 'ok.src', 'out': 'ok.out'}, {'source': 'ok.src', 'out': 'bad.out'}], file)
+            summary_file = os.path.join(directory, 'summary.json')
+            batch = interpret.Batch([os.path.join(directory, '*.src'), os.path.join(directory, 'manifest.json')],
+                                    workers=2, timeout=0.5)
+            self.assertEqual(batch.run(summary_file), 1)
+            with open(summary_file) as file:
+                summary = json.load(file)
+        # Jobs of the glob pattern (bad, fail, loop, ok) are followed by the jobs of the manifest
+        jobs = summary['jobs']
+        self.assertEqual((summary['total'], summary['passed']), (6, 3))
+        self.assertEqual([job['passed'] for job in jobs], [False, True, False, True, True, False])
+        self.assertEqual([job['output_matches'] for job in jobs], [False, None, None, True, True, False])
+        self.assertEqual([job['rc'] for job in jobs], [0, 54, None, 0, 0, 0])
+        self.assertEqual([job['timeout'] for job in jobs], [False, False, True, False, False, False])
+        # The jobs of ok.src run in the same worker and reuse the compiled program
+        self.assertEqual(sorted(job['reused'] for job in jobs[3:]), [False, True, True])
+
+    def test_entry(self):
+        # Missing optional keys are None and the expected return code is 0
+        job, = self.read([{'source': 'a.src', 'input': None}])
+        self.assertEqual((os.path.basename(job['source']), job['input'], job['out'], job['expected_rc']),
+                         ('a.src', None, None, 0))
+
+
+class ProgramCacheTest(unittest.TestCase):
+    """
+    Compiled program cache test class
+    """
+    def test_stream_source(self):
+        # Programs read from streams are cached by their bytes and the stream is parsed after hashing
+        with tempfile.TemporaryDirectory() as directory:
+            for source in (write('int', '7'), write('int', '7'), io.StringIO(write('int', '7').read().decode())):
+                with self.subTest(source=source):
+                    output = io.StringIO()
+                    self.assertEqual(interpret.run(source, io.StringIO(), output, cache_dir=directory), (0, {}))
+                    self.assertEqual(output.getvalue(), '7')
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+
+class SamplerTest(unittest.TestCase):
+    """
+    Sampling profiler test class
+    """
+    @unittest.skipUnless(hasattr(signal, 'setitimer'), 'needs interval timers')
+    def test_previous_handler(self):
+        # The SIGPROF handler installed before sampling is restored when it stops
+        def handler(signum: int, frame: any) -> None:
+            # Handler of the application
+            pass
+
+        previous = signal.signal(signal.SIGPROF, handler)
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                interpret.run(write('int', '1'), io.StringIO(), io.StringIO(),
+                              sample_profile=os.path.join(directory, 'profile'))
+            self.assertIs(signal.getsignal(signal.SIGPROF), handler)
+        finally:
+            signal.signal(signal.SIGPROF, previous)
+
+
+class SampledPositionTest(unittest.TestCase):
+    """
+    Sampled instruction position test class
+    """
+    def test_compiled_block(self):
+        # The position inside a compiled block is the instruction calling the handler, not the block start
+        positions = []
+
+        class Errors(io.StringIO):
+            def write(self, text: str) -> int:
+                positions.append(inter.function.current_position(sys._getframe()))
+                return super().write(text)
+
+        source = program(
+            'opcode="DEFVAR"><arg1 type="var">GF@a</arg1>',
+            'opcode="MOVE"><arg1 type="var">GF@a</arg1><arg2 type="int">0</arg2>',
+            'opcode="LABEL"><arg1 type="label">loop</arg1>',
+            'opcode="ADD"><arg1 type="var">GF@a</arg1><arg2 type="var">GF@a</arg2><arg3 type="int">1</arg3>',
+            'opcode="DPRINT"><arg1 type="var">GF@a</arg1>',
+            'opcode="JUMPIFNEQ"><arg1 type="label">loop</arg1><arg2 type="var">GF@a</arg2><arg3 type="int">3</arg3>',
+        )
+        inter = interpret.Interpreter(io.StringIO(), set(), stdout=io.StringIO(), stderr=Errors(), engine='compiled')
+        with mock.patch.object(interpret.CompiledFunction, 'HOT', 1):
+            inter.interpret(interpret.load_program(source))
+        self.assertEqual(set(positions), {3})
+
+
+class OptimizerTest(unittest.TestCase):
+    """
+    Program optimizer test class
+    """
+    def optimize(self, *instructions: str) -> list:
+        # Optimize the program and return the opcodes and operands of its instructions
+        optimized = interpret.Optimizer(interpret.load_program(program(*instructions))).run()
+        return list(zip(optimized.opcodes, optimized.operands))
+
+    def test_folding(self):
+        # Instructions with constant symbs become MOVE of their result and the result is propagated
+        self.assertEqual(self.optimize(
+            'opcode="DEFVAR"><arg1 type="var">GF@x</arg1>',
+            'opcode="ADD"><arg1 type="var">GF@x</arg1><arg2 type="int">2</arg2><arg3 type="int">3</arg3>',
+            'opcode="MUL"><arg1 type="var">GF@x</arg1><arg2 type="var">GF@x</arg2><arg3 type="int">2</arg3>',
+            'opcode="WRITE"><arg1 type="var">GF@x</arg1>',
+        ), [('DEFVAR', ((interpret.GF, 1),)), ('MOVE', ((interpret.GF, 1), 5)), ('MOVE', ((interpret.GF, 1), 10)),
+            ('WRITE', (10,))])
+
+    def test_failing_folding(self):
+        # Instructions whose evaluation fails are kept for the runtime, also when they are unreachable
+        instructions = (
+            'opcode="DEFVAR"><arg1 type="var">GF@x</arg1>',
+            'opcode="JUMP"><arg1 type="label">end</arg1>',
+            'opcode="FLOAT2INT"><arg1 type="var">GF@x</arg1><arg2 type="float">inf</arg2>',
+            'opcode="INT2CHAR"><arg1 type="var">GF@x</arg1><arg2 type="int">99999999999999999999</arg2>',
+            'opcode="IDIV"><arg1 type="var">GF@x</arg1><arg2 type="int">1</arg2><arg3 type="int">0</arg3>',
+            'opcode="LABEL"><arg1 type="label">end</arg1>',
+            'opcode="WRITE"><arg1 type="string">ok</arg1>',
+        )
+        self.assertEqual([opcode for opcode, _ in self.optimize(*instructions)], ['DEFVAR', 'JUMP', 'WRITE'])
+        output = io.StringIO()
+        self.assertEqual(interpret.run(program(*instructions), io.StringIO(), output, optimize=True), (0, {}))
+        self.assertEqual(output.getvalue(), 'ok')
+        with self.assertRaises(interpret.OperandValueError):
+            interpret.run(program(*instructions[:1], *instructions[4:]), io.StringIO(), io.StringIO(), optimize=True)
+
+    def test_propagation_stops_at_targets(self):
+        # Constants are not propagated into jump targets and over calls
+        optimized = self.optimize(
+            'opcode="DEFVAR"><arg1 type="var">GF@x</arg1>',
+            'opcode="MOVE"><arg1 type="var">GF@x</arg1><arg2 type="int">1</arg2>',
+            'opcode="LABEL"><arg1 type="label">loop</arg1>',
+            'opcode="WRITE"><arg1 type="var">GF@x</arg1>',
+            'opcode="MOVE"><arg1 type="var">GF@x</arg1><arg2 type="int">2</arg2>',
+            'opcode="CALL"><arg1 type="label">f</arg1>',
+            'opcode="WRITE"><arg1 type="var">GF@x</arg1>',
+            'opcode="JUMP"><arg1 type="label">loop</arg1>',
+            'opcode="LABEL"><arg1 type="label">f</arg1>',
+            'opcode="MOVE"><arg1 type="var">GF@x</arg1><arg2 type="int">3</arg2>',
+            'opcode="RETURN">',
+        )
+        self.assertEqual([operands for opcode, operands in optimized if opcode == 'WRITE'],
+                         [((interpret.GF, 1),), ((interpret.GF, 1),)])
+
+    def test_unreachable(self):
+        # Unreachable instructions are removed and jump targets renumbered, code after a CALL is kept
+        optimized = self.optimize(
+            'opcode="CALL"><arg1 type="label">f</arg1>',
+            'opcode="JUMP"><arg1 type="label">end</arg1>',
+            'opcode="WRITE"><arg1 type="string">dead</arg1>',
+            'opcode="LABEL"><arg1 type="label">f</arg1>',
+            'opcode="RETURN">',
+            'opcode="WRITE"><arg1 type="string">dead</arg1>',
+            'opcode="LABEL"><arg1 type="label">end</arg1>',
+            'opcode="WRITE"><arg1 type="string">end</arg1>',
+        )
+        self.assertEqual(optimized, [('CALL', (1,)), ('JUMP', (2,)), ('RETURN', ()), ('WRITE', ('end',))])
+
+
+class XMLErrorTest(unittest.TestCase):
+    """
+    XML source error test class
+    """
+    HEADER = '<?xml version="1.0" encoding="UTF-8"?>'
+
+    def load(self, text: str) -> list:
+        # Parse the XML text into instructions
+        return interpret.Instruction.get_instructions_from_xml(io.BytesIO((self.HEADER + text).encode()))
+
+    def test_format_error_first(self):
+        # A malformed document is a format error even if the root or an earlier instruction is invalid
+        for text in ('<program language="Python"><instruction order="1" opcode="BREAK"></program>',
+                     '<program language="IPPcode23"><instruction opcode="BREAK"/><instruction order="2">',
+                     '<program language="IPPcode23"><instruction order="1" opcode="WRITE"><arg2 type="int">1</arg2>'
+                     '</instruction></program><trailing/>'):
+            with self.subTest(text=text):
+                with self.assertRaises(interpret.XMLFormatError):
+                    self.load(text)
+
+    def test_structure_error(self):
+        # A well-formed document with an invalid root or instruction is a structure error
+        for text in ('<program language="Python"></program>',
+                     '<program language="IPPcode23"><instruction opcode="BREAK"/></program>',
+                     '<program language="IPPcode23"><instruction order="1" opcode="WRITE"><arg2 type="int">1</arg2>'
+                     '</instruction></program>'):
+            with self.subTest(text=text):
+                with self.assertRaises(interpret.XMLStructureError):
+                    self.load(text)
+
+
+class MemoizerTest(unittest.TestCase):
+    """
+    Function memoization test class
+    """
+    # Calls of f with the argument 21 on the data stack, the result is written from the stack and the frame
+    CALLER = (
+        'opcode="DEFVAR"><arg1 type="var">GF@a</arg1>',
+        'opcode="CREATEFRAME">', 'opcode="PUSHS"><arg1 type="int">21</arg1>',
+        'opcode="CALL"><arg1 type="label">f</arg1>', 'opcode="POPS"><arg1 type="var">GF@a</arg1>',
+        'opcode="WRITE"><arg1 type="var">GF@a</arg1>', 'opcode="WRITE"><arg1 type="var">TF@r</arg1>',
+        'opcode="CREATEFRAME">', 'opcode="PUSHS"><arg1 type="int">21</arg1>',
+        'opcode="CALL"><arg1 type="label">f</arg1>', 'opcode="POPS"><arg1 type="var">GF@a</arg1>',
+        'opcode="WRITE"><arg1 type="var">GF@a</arg1>', 'opcode="WRITE"><arg1 type="var">TF@r</arg1>',
+        'opcode="EXIT"><arg1 type="int">0</arg1>', 'opcode="LABEL"><arg1 type="label">f</arg1>',
+    )
+    # Pure function doubling the value on the data stack, it also leaves the result in its frame
+    DOUBLE = (
+        'opcode="PUSHFRAME">', 'opcode="DEFVAR"><arg1 type="var">LF@r</arg1>',
+        'opcode="POPS"><arg1 type="var">LF@r</arg1>',
+        'opcode="MUL"><arg1 type="var">LF@r</arg1><arg2 type="var">LF@r</arg2><arg3 type="int">2</arg3>',
+        'opcode="PUSHS"><arg1 type="var">LF@r</arg1>', 'opcode="POPFRAME">', 'opcode="RETURN">',
+    )
+
+    def memoized(self, *body: str) -> bool:
+        # Check if f with the given body is memoized
+        compiled = interpret.load_program(program(*self.CALLER, *body))
+        return compiled.labels['f'] in interpret.Memoizer(compiled).run()
+
+    def test_pure(self):
+        # A function using only its own frame and the data stack is memoized with the values it reads
+        compiled = interpret.load_program(program(*self.CALLER, *self.DOUBLE))
+        self.assertEqual(interpret.Memoizer(compiled).run(), {compiled.labels['f']: 1})
+
+    def test_impure(self):
+        # Input and output, global and caller frame variables, path dependent stack depths and frames left
+        # on the frame stack make a function impure
+        for body in (('opcode="WRITE"><arg1 type="int">1</arg1>',),
+                     ('opcode="READ"><arg1 type="var">TF@r</arg1><arg2 type="type">int</arg2>',),
+                     ('opcode="MOVE"><arg1 type="var">GF@a</arg1><arg2 type="int">1</arg2>',),
+                     ('opcode="DEFVAR"><arg1 type="var">LF@r</arg1>',),
+                     ('opcode="PUSHS"><arg1 type="int">1</arg1>', 'opcode="PUSHS"><arg1 type="int">1</arg1>',
+                      'opcode="JUMPIFEQS"><arg1 type="label">end</arg1>', 'opcode="PUSHS"><arg1 type="int">3</arg1>',
+                      'opcode="LABEL"><arg1 type="label">end</arg1>'),
+                     ('opcode="PUSHFRAME">',)):
+            with self.subTest(body=body):
+                self.assertFalse(self.memoized(*body, 'opcode="RETURN">'))
+        self.assertTrue(self.memoized('opcode="RETURN">'))
+
+    def test_hit(self):
+        # A cache hit restores the temporary frame and the data stack, only the statistics of the skipped
+        # instructions differ
+        for engine in ('basic', 'compiled'):
+            results = []
+            for memoize in (None, 16):
+                output = io.StringIO()
+                code, stats = interpret.run(program(*self.CALLER, *self.DOUBLE), io.StringIO(), output,
+                                            {'insts', 'vars', 'memo-hits', 'memo-misses'}, engine=engine,
+                                            memoize=memoize)
+                results.append((code, output.getvalue(), stats))
+            with self.subTest(engine=engine):
+                self.assertEqual(results[0][:2], (0, '42424242'))
+                self.assertEqual(results[1][:2], results[0][:2])
+                self.assertEqual((results[1][2]['memo-hits'], results[1][2]['memo-misses']), (1, 1))
+                self.assertEqual(results[0][2]['insts'] - results[1][2]['insts'], len(self.DOUBLE))
+                self.assertEqual(results[1][2]['vars'], results[0][2]['vars'])
+
+
+class TypeInferenceTest(unittest.TestCase):
+    """
+    Static type inference test class
+    """
+    def bound(self, *instructions: str) -> list:
+        # Names of the handlers bound to the instructions of the program with inferred types
+        compiled = interpret.load_program(program(*instructions))
+        inter = interpret.Interpreter(io.StringIO(), set(), stdout=io.StringIO(), infer_types=True)
+        return [handler.__name__ for handler, _ in inter._bind(compiled, interpret.TypeInference(compiled).run())]
+
+    def run_program(self, *instructions: str) -> int:
+        # Run the program with inferred types and return its exit code
+        try:
+            code, _ = interpret.run(program(*instructions), io.StringIO(), io.StringIO(), infer_types=True)
+        except interpret.InterpretError as error:
+            code = error.code
+        return code
+
+    def test_proven(self):
+        # A variable with a single type on every path gets the handler without type checks
+        self.assertEqual(self.bound(
+            'opcode="DEFVAR"><arg1 type="var">GF@x</arg1>',
+            'opcode="MOVE"><arg1 type="var">GF@x</arg1><arg2 type="int">1</arg2>',
+            'opcode="ADD"><arg1 type="var">GF@x</arg1><arg2 type="var">GF@x</arg2><arg3 type="int">1</arg3>',
+        )[-1], 'fast_add')
+
+    def test_merged_paths(self):
+        # Types differing between the paths joined by a label are not proven and keep their checks
+        instructions = (
+            'opcode="DEFVAR"><arg1 type="var">GF@x</arg1>',
+            'opcode="MOVE"><arg1 type="var">GF@x</arg1><arg2 type="int">1</arg2>',
+            'opcode="JUMPIFNEQ"><arg1 type="label">add</arg1><arg2 type="int">1</arg2><arg3 type="int">1</arg3>',
+            'opcode="MOVE"><arg1 type="var">GF@x</arg1><arg2 type="string">a</arg2>',
+            'opcode="LABEL"><arg1 type="label">add</arg1>',
+            'opcode="ADD"><arg1 type="var">GF@x</arg1><arg2 type="var">GF@x</arg2><arg3 type="int">1</arg3>',
+        )
+        self.assertEqual(self.bound(*instructions)[-1], 'instr_add')
+        self.assertEqual(self.run_program(*instructions), 53)
+
+    def test_call_writes_frame(self):
+        # A called function may change the type of any variable of a shared frame
+        for frame in ('GF', 'TF'):
+            instructions = (
+                'opcode="CREATEFRAME">', f'opcode="DEFVAR"><arg1 type="var">{frame}@x</arg1>',
+                f'opcode="MOVE"><arg1 type="var">{frame}@x</arg1><arg2 type="int">1</arg2>',
+                'opcode="CALL"><arg1 type="label">f</arg1>',
+                f'opcode="ADD"><arg1 type="var">{frame}@x</arg1><arg2 type="var">{frame}@x</arg2>'
+                f'<arg3 type="int">1</arg3>',
+                'opcode="EXIT"><arg1 type="int">0</arg1>',
+                'opcode="LABEL"><arg1 type="label">f</arg1>',
+                f'opcode="MOVE"><arg1 type="var">{frame}@x</arg1><arg2 type="string">a</arg2>',
+                'opcode="RETURN">',
+            )
+            with self.subTest(frame=frame):
+                self.assertEqual(self.bound(*instructions)[4], 'instr_add')
+                self.assertEqual(self.run_program(*instructions), 53)
+
+    def test_missing_value(self):
+        # Proven types do not hide errors of instructions without type checks
+        self.assertEqual(self.run_program(
+            'opcode="DEFVAR"><arg1 type="var">GF@x</arg1>',
+            'opcode="MOVE"><arg1 type="var">GF@x</arg1><arg2 type="int">1</arg2>',
+            'opcode="POPS"><arg1 type="var">GF@x</arg1>',
+            'opcode="ADD"><arg1 type="var">GF@x</arg1><arg2 type="var">GF@x</arg2><arg3 type="int">1</arg3>',
+        ), 56)
+
+
+class CompiledEngineTest(unittest.TestCase):
+    """
+    Compiled engine test class
+    """
+    # Loop running its body with GF@i from 0 to 39, more than CompiledFunction.HOT times
+    LOOP = (
+        instruction('DEFVAR', 'var:GF@i'), instruction('MOVE', 'var:GF@i', 'int:0'),
+        instruction('DEFVAR', 'var:GF@s'), instruction('MOVE', 'var:GF@s', 'int:0'),
+        instruction('DEFVAR', 'var:GF@d'), instruction('MOVE', 'var:GF@d', 'int:1'),
+        instruction('LABEL', 'label:loop'),
+    )
+    END = (
+        instruction('ADD', 'var:GF@i', 'var:GF@i', 'int:1'),
+        instruction('JUMPIFNEQ', 'label:loop', 'var:GF@i', 'int:40'),
+        instruction('WRITE', 'var:GF@s'),
+    )
+
+    def run_engines(self, *instructions: str) -> list:
+        # Run the program by the basic and the compiled engine, return their exit codes and outputs
+        results = []
+        for engine in ('basic', 'compiled'):
+            output = io.StringIO()
+            try:
+                code, _ = interpret.run(program(*instructions), io.StringIO(), output, engine=engine)
+            except interpret.InterpretError as error:
+                code = error.code
+            results.append((code, output.getvalue()))
+        return results
+
+    def test_type_change(self):
+        # A hot block whose operands change their type leaves the inline fast path for the generic handler
+        basic, compiled = self.run_engines(
+            *self.LOOP,
+            instruction('JUMPIFNEQ', 'label:add', 'var:GF@i', 'int:35'),
+            instruction('INT2FLOAT', 'var:GF@s', 'var:GF@s'), instruction('MOVE', 'var:GF@d', 'float:0x1p-1'),
+            instruction('LABEL', 'label:add'),
+            instruction('ADD', 'var:GF@s', 'var:GF@s', 'var:GF@d'),
+            *self.END,
+        )
+        self.assertEqual(basic, (0, '0x1.2c00000000000p+5'))
+        self.assertEqual(compiled, basic)
+
+    def test_error_in_block(self):
+        # An error inside a hot block stops the program with its code after the output written before it
+        basic, compiled = self.run_engines(
+            *self.LOOP,
+            instruction('WRITE', 'var:GF@i'),
+            instruction('JUMPIFNEQ', 'label:add', 'var:GF@i', 'int:35'),
+            instruction('MOVE', 'var:GF@d', 'string:x'),
+            instruction('LABEL', 'label:add'),
+            instruction('ADD', 'var:GF@s', 'var:GF@s', 'var:GF@d'),
+            instruction('WRITE', 'string:,'),
+            *self.END,
+        )
+        self.assertEqual(basic, (53, ','.join(str(num) for num in range(36))))
+        self.assertEqual(compiled, basic)
+
+    def test_jump_into_block(self):
+        # A jump to a label inside straight-line code continues in the middle of the hot code
+        basic, compiled = self.run_engines(
+            *self.LOOP,
+            instruction('JUMPIFEQ', 'label:middle', 'var:GF@i', 'int:20'),
+            instruction('ADD', 'var:GF@s', 'var:GF@s', 'int:100'),
+            instruction('LABEL', 'label:middle'),
+            instruction('ADD', 'var:GF@s', 'var:GF@s', 'var:GF@d'),
+            *self.END,
+        )
+        self.assertEqual(basic, (0, '3940'))
+        self.assertEqual(compiled, basic)
+
+
+class SuperinstructionsTest(unittest.TestCase):
+    """
+    Superinstruction test class
+    """
+    SOURCE = (
+        instruction('DEFVAR', 'var:GF@i'), instruction('MOVE', 'var:GF@i', 'int:0'), instruction('DEFVAR', 'var:GF@c'),
+        instruction('LABEL', 'label:loop'),
+        instruction('ADD', 'var:GF@i', 'var:GF@i', 'int:1'),
+        instruction('LT', 'var:GF@c', 'var:GF@i', 'int:10'),
+        instruction('JUMPIFEQ', 'label:loop', 'var:GF@c', 'bool:true'),
+        instruction('JUMPIFEQ', 'label:middle', 'var:GF@i', 'int:10'),
+        instruction('MOVE', 'var:GF@c', 'int:5'),
+        # MOVE and JUMP are not fused because the label is a jump target between them
+        instruction('LABEL', 'label:middle'),
+        instruction('JUMP', 'label:end'),
+        instruction('LABEL', 'label:end'),
+        instruction('ADD', 'var:GF@i', 'var:GF@i', 'int:1'),
+        instruction('JUMP', 'label:write'),
+        instruction('LABEL', 'label:write'),
+        instruction('WRITE', 'var:GF@i'), instruction('WRITE', 'var:GF@c'),
+    )
+
+    def test_fused_sequences(self):
+        # Matching sequences are fused unless a jump target lies inside them
+        compiled = interpret.load_program(program(*self.SOURCE))
+        inter = interpret.Interpreter(io.StringIO(), set(), stdout=io.StringIO())
+        code = inter._bind(compiled)
+        interpret.Superinstructions().fuse(inter.function, compiled, code)
+        fused = [compiled.opcodes[position] for position, (handler, _) in enumerate(code)
+                 if handler.__name__ == 'combined']
+        self.assertEqual(fused, ['LT', 'ADD'])
+
+    def test_same_results(self):
+        # Fused and unfused runs have the same output and statistics
+        results = []
+        for superinstructions in (None, interpret.Superinstructions()):
+            output = io.StringIO()
+            results.append((interpret.run(program(*self.SOURCE), io.StringIO(), output, {'insts', 'hot'},
+                                          superinstructions=superinstructions), output.getvalue()))
+        self.assertEqual(results[0], ((0, {'insts': 39, 'hot': 5}), '11false'))
+        self.assertEqual(results[1], results[0])
+
+
+class AdaptiveEngineTest(unittest.TestCase):
+    """
+    Adaptive engine test class
+    """
+    def run_adaptive(self, iterations: int, change: str) -> tuple:
+        # Run a loop adding GF@d to GF@s whose operands change to the type of change after 5 iterations,
+        # return the result and the handler names of both ADD sites
+        source = program(
+            instruction('DEFVAR', 'var:GF@i'), instruction('MOVE', 'var:GF@i', 'int:0'),
+            instruction('DEFVAR', 'var:GF@s'), instruction('MOVE', 'var:GF@s', 'int:0'),
+            instruction('DEFVAR', 'var:GF@d'), instruction('MOVE', 'var:GF@d', 'int:1'),
+            instruction('LABEL', 'label:loop'),
+            instruction('JUMPIFNEQ', 'label:add', 'var:GF@i', 'int:5'),
+            instruction('MOVE', 'var:GF@s', change), instruction('MOVE', 'var:GF@d', change),
+            instruction('LABEL', 'label:add'),
+            instruction('ADD', 'var:GF@s', 'var:GF@s', 'var:GF@d'),
+            instruction('ADD', 'var:GF@i', 'var:GF@i', 'int:1'),
+            instruction('JUMPIFNEQ', 'label:loop', 'var:GF@i', f'int:{iterations}'),
+            instruction('WRITE', 'var:GF@s'),
+        )
+        output = io.StringIO()
+        inter = interpret.Interpreter(io.StringIO(), set(), stdout=output, engine='adaptive')
+        try:
+            inter.interpret(interpret.load_program(source))
+            code = 0
+        except interpret.InterpretError as error:
+            code = error.code
+        return code, output.getvalue(), [handler.__name__ for handler, _ in inter.function.code[9:11]]
+
+    def test_deoptimization(self):
+        # A specialized site takes the generic handler for other operand types and gives up after MAX_MISSES
+        self.assertEqual(self.run_adaptive(10, 'float:0x1p+0'),
+                         (0, '0x1.8000000000000p+2', ['specialized', 'specialized']))
+        misses = interpret.AdaptiveFunction.MAX_MISSES
+        self.assertEqual(self.run_adaptive(6 + misses, 'float:0x1p+0'),
+                         (0, f'{float(misses + 2).hex()}', ['instr_add', 'specialized']))
+
+    def test_type_error(self):
+        # Operands of a wrong type still fail with 53 after the site was specialized
+        self.assertEqual(self.run_adaptive(10, 'string:a')[:2], (53, ''))
+
+
+class StringBufferTest(unittest.TestCase):
+    """
+    String buffer test class
+    """
+    # Loop extending GF@x by itself 40 times, which keeps it in a string buffer
+    BUILD = (
+        instruction('DEFVAR', 'var:GF@i'), instruction('MOVE', 'var:GF@i', 'int:0'),
+        instruction('DEFVAR', 'var:GF@x'), instruction('MOVE', 'var:GF@x', 'string:'),
+        instruction('DEFVAR', 'var:GF@y'), instruction('DEFVAR', 'var:GF@z'),
+        instruction('LABEL', 'label:loop'),
+        instruction('CONCAT', 'var:GF@x', 'var:GF@x', 'string:ab'),
+        instruction('ADD', 'var:GF@i', 'var:GF@i', 'int:1'),
+        instruction('JUMPIFNEQ', 'label:loop', 'var:GF@i', 'int:40'),
+    )
+
+    def run_engines(self, *instructions: str) -> dict:
+        # Run the program by every engine, return their exit codes and outputs
+        results = {}
+        for engine in sorted(interpret.Interpreter.ENGINES):
+            output = io.StringIO()
+            try:
+                code, _ = interpret.run(program(*self.BUILD, *instructions), io.StringIO(), output, engine=engine)
+            except interpret.InterpretError as error:
+                code = error.code
+            results[engine] = code, output.getvalue()
+        return results
+
+    def test_string_instructions(self):
+        # STRLEN, GETCHAR, STRI2INT and CONCAT read the buffer like the string it holds
+        results = self.run_engines(
+            instruction('STRLEN', 'var:GF@y', 'var:GF@x'), instruction('WRITE', 'var:GF@y'),
+            instruction('GETCHAR', 'var:GF@y', 'var:GF@x', 'int:79'), instruction('WRITE', 'var:GF@y'),
+            instruction('STRI2INT', 'var:GF@y', 'var:GF@x', 'int:2'), instruction('WRITE', 'var:GF@y'),
+            instruction('CONCAT', 'var:GF@y', 'var:GF@x', 'string:!'), instruction('STRLEN', 'var:GF@y', 'var:GF@y'),
+            instruction('WRITE', 'var:GF@y'), instruction('TYPE', 'var:GF@y', 'var:GF@x'),
+            instruction('WRITE', 'var:GF@y'), instruction('GETCHAR', 'var:GF@y', 'var:GF@x', 'int:80'),
+        )
+        for engine, result in results.items():
+            with self.subTest(engine=engine):
+                self.assertEqual(result, (58, '80b9781string'))
+
+    def test_shared_setchar(self):
+        # SETCHAR changes only its own variable, never a copy made by MOVE or PUSHS
+        results = self.run_engines(
+            instruction('MOVE', 'var:GF@y', 'var:GF@x'), instruction('PUSHS', 'var:GF@x'),
+            instruction('SETCHAR', 'var:GF@x', 'int:0', 'string:X'),
+            instruction('SETCHAR', 'var:GF@y', 'int:1', 'string:Y'),
+            instruction('CONCAT', 'var:GF@x', 'var:GF@x', 'string:!'),
+            instruction('POPS', 'var:GF@z'),
+            instruction('GETCHAR', 'var:GF@i', 'var:GF@x', 'int:0'), instruction('WRITE', 'var:GF@i'),
+            instruction('GETCHAR', 'var:GF@i', 'var:GF@x', 'int:1'), instruction('WRITE', 'var:GF@i'),
+            instruction('GETCHAR', 'var:GF@i', 'var:GF@x', 'int:80'), instruction('WRITE', 'var:GF@i'),
+            instruction('GETCHAR', 'var:GF@i', 'var:GF@y', 'int:0'), instruction('WRITE', 'var:GF@i'),
+            instruction('GETCHAR', 'var:GF@i', 'var:GF@y', 'int:1'), instruction('WRITE', 'var:GF@i'),
+            instruction('GETCHAR', 'var:GF@i', 'var:GF@z', 'int:0'), instruction('WRITE', 'var:GF@i'),
+            instruction('GETCHAR', 'var:GF@i', 'var:GF@z', 'int:1'), instruction('WRITE', 'var:GF@i'),
+            instruction('STRLEN', 'var:GF@i', 'var:GF@z'), instruction('WRITE', 'var:GF@i'),
+        )
+        for engine, result in results.items():
+            with self.subTest(engine=engine):
+                self.assertEqual(result, (0, 'Xb!aYab80'))
+
+
+class ProfilerTest(unittest.TestCase):
+    """
+    Execution profiler test class
+    """
+    def test_recursive_profile(self):
+        # Every depth of a recursive label gets its own collapsed stack, the stacks add up to the total time
+        # and the report counts every executed instruction at its order
+        source = program(
+            instruction('DEFVAR', 'var:GF@n'), instruction('MOVE', 'var:GF@n', 'int:3'),
+            instruction('CALL', 'label:f'), instruction('JUMP', 'label:done'),
+            instruction('LABEL', 'label:f'),
+            instruction('JUMPIFEQ', 'label:end', 'var:GF@n', 'int:0'),
+            instruction('SUB', 'var:GF@n', 'var:GF@n', 'int:1'), instruction('WRITE', 'var:GF@n'),
+            instruction('CALL', 'label:f'),
+            instruction('LABEL', 'label:end'), instruction('RETURN'),
+            instruction('LABEL', 'label:done'),
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, 'profile')
+            output = io.StringIO()
+            code, stats = interpret.run(source, io.StringIO(), output, {'insts'}, profile=file_name)
+            with open(file_name) as file:
+                stacks = dict(line.rsplit(' ', 1) for line in file.read().splitlines())
+            with open(file_name + '.txt') as file:
+                report = file.read().splitlines()
+        self.assertEqual((code, stats, output.getvalue()), (0, {'insts': 21}, '210'))
+        self.assertEqual(sorted(stacks), ['main', 'main;f', 'main;f;f', 'main;f;f;f', 'main;f;f;f;f'])
+
+        # Stack times are rounded to microseconds, the total time to microseconds as well
+        total = float(report[0].split()[2])
+        self.assertEqual(report[0].split(': ')[-1], '21')
+        self.assertLessEqual(abs(sum(int(value) for value in stacks.values()) - total * 1e6), len(stacks) + 1)
+
+        start = report.index('Instructions by time:') + 2
+        counts = {(int(order), opcode): int(count)
+                  for order, opcode, count, *_ in (line.split() for line in report[start:report.index('', start)])}
+        self.assertEqual(counts, {(1, 'DEFVAR'): 1, (2, 'MOVE'): 1, (3, 'CALL'): 1, (4, 'JUMP'): 1,
+                                  (6, 'JUMPIFEQ'): 4, (7, 'SUB'): 3, (8, 'WRITE'): 3, (9, 'CALL'): 3,
+                                  (11, 'RETURN'): 4})
+        labels = {line.split()[0]: int(line.split()[1]) for line in report[report.index('Labels by total time:') + 2:]}
+        self.assertEqual(labels, {'main': 0, 'f': 4})
+
+
+@unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'needs Unix domain sockets')
+class ServerTest(unittest.TestCase):
+    """
+    Interpreter server test class
+    """
+    def setUp(self):
+        # Start the server on a socket in a temporary directory and wait until it listens
+        self.directory = tempfile.TemporaryDirectory()
+        self.address = os.path.join(self.directory.name, 'server.sock')
+        self.server = subprocess.Popen([sys.executable, interpret.__file__, f'--serve={self.address}'])
+        deadline = time.monotonic() + 10
+        while not os.path.exists(self.address) and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+    def tearDown(self):
+        # Stop the server, it removes its socket
+        self.server.terminate()
+        self.server.wait()
+        self.directory.cleanup()
+
+    def submit(self, *instructions: str, **job: any) -> tuple:
+        # Send the program as inline XML and return the exit code, statistics and output of the job
+        output = io.StringIO()
+        job['xml'] = program(*instructions).read().decode()
+        code, stats = interpret.Server.submit(self.address, job, output, io.StringIO())
+        return code, stats, output.getvalue()
+
+    def test_round_trip(self):
+        # The output, the input and the statistics of a job are sent back
+        self.assertEqual(self.submit(instruction('DEFVAR', 'var:GF@x'), instruction('READ', 'var:GF@x', 'type:int'),
+                                     instruction('WRITE', 'var:GF@x'), input='42\n', stats=['insts']),
+                         (0, {'insts': 3}, '42'))
+
+    def test_program_error(self):
+        # A failing program returns its exit code after the output written before the error
+        self.assertEqual(self.submit(instruction('WRITE', 'string:a'), instruction('WRITE', 'var:GF@x')),
+                         (54, {}, 'a'))
+
+    def test_malformed_job(self):
+        # A line which is not a JSON job is answered by the parameter error code
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(self.address)
+            connection.sendall(b'{"xml": \n')
+            with connection.makefile('rb') as file:
+                self.assertEqual(json.loads(file.readline())['rc'], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()